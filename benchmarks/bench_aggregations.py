@@ -0,0 +1,87 @@
+# path/benchmarks/bench_aggregations.py
+
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from config.settings import TIME_POINTS
+from aggregations import timepoint_scores
+
+# In-memory fixture shaped like load_data(): client_form_responses with a score column and the
+# response table holding the same scores as text
+def make_fixture(num_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    ids = np.arange(1, num_rows + 1)
+    scores = rng.integers(0, 5, size=num_rows, dtype=np.int8)
+    client_form_responses = pd.DataFrame({
+        'id': ids,
+        'client_id': rng.integers(1, num_rows // 425 + 2, size=num_rows),
+        'form_id': rng.integers(1, 9, size=num_rows),
+        'protocol_id': rng.integers(1, 6, size=num_rows),
+        'question_id': rng.integers(1, 101, size=num_rows),
+        'response_id': ids,
+        'time_point': np.array(TIME_POINTS, dtype=object)[rng.integers(0, len(TIME_POINTS), size=num_rows)],
+        'score': scores,
+    })
+    responses = pd.DataFrame({'id': ids, 'text': scores.astype(str).astype(object)})
+    forms = pd.DataFrame({'id': np.arange(1, 9), 'name': [f"Form {i}" for i in range(1, 9)]})
+    protocols = pd.DataFrame({'id': np.arange(1, 6), 'name': [f"Protocol {i}" for i in range(1, 6)]})
+    return client_form_responses, responses, forms, protocols
+
+# The Overview page aggregation as it was before the aggregations module: one apply per statistic,
+# each group mapping response ids through the text scores
+def legacy_overview(client_form_responses, responses, forms, protocols):
+    results = []
+    for by, entities in (('form_id', forms), ('protocol_id', protocols)):
+        avg_scores = client_form_responses.groupby([by, 'time_point']).apply(
+            lambda x: x['response_id'].map(responses.set_index('id')['text'].astype(int)).mean() * 100 / 4
+        ).reset_index(name='average_score')
+        counts = client_form_responses.groupby([by, 'time_point']).size().reset_index(name='count')
+        scores_with_counts = avg_scores.merge(counts, on=[by, 'time_point'])
+        scores_with_counts = scores_with_counts.merge(entities, left_on=by, right_on='id')
+        std_devs = client_form_responses.groupby([by, 'time_point']).apply(
+            lambda x: x['response_id'].map(responses.set_index('id')['text'].astype(int)).std() * 100 / 4
+        ).reset_index(name='std_dev')
+        results.append(scores_with_counts.merge(std_devs, on=[by, 'time_point']))
+    return results
+
+def vectorized_overview(client_form_responses, responses, forms, protocols):
+    return [timepoint_scores(client_form_responses, 'form_id', forms),
+            timepoint_scores(client_form_responses, 'protocol_id', protocols)]
+
+def best_of(repeat, func, *args):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func(*args)
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Overview page aggregations.")
+    parser.add_argument("--rows", type=int, default=5_000_000, help="Rows in the client_form_response fixture.")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per implementation; the best is reported.")
+    parser.add_argument("--skip-legacy", action="store_true", help="Only time the vectorized implementation.")
+    args = parser.parse_args()
+
+    fixture = make_fixture(args.rows)
+    print(f"Fixture: {args.rows:,} rows")
+
+    vectorized_time, vectorized = best_of(args.repeat, vectorized_overview, *fixture)
+    print(f"  vectorized (bincount):      {vectorized_time:8.3f}s")
+    if args.skip_legacy:
+        return
+
+    legacy_time, legacy = best_of(1, legacy_overview, *fixture)
+    print(f"  legacy groupby().apply():   {legacy_time:8.3f}s  ({legacy_time / vectorized_time:,.0f}x slower)")
+
+    by_columns = ['form_id', 'protocol_id']
+    for by, new, old in zip(by_columns, vectorized, legacy):
+        merged = new.merge(old, on=[by, 'time_point'], suffixes=('', '_legacy'))
+        assert len(merged) == len(old)
+        for column in ['average_score', 'std_dev', 'count']:
+            assert np.allclose(merged[column], merged[f"{column}_legacy"]), column
+    print("  results match")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+# path/benchmarks/bench_cold_start.py
+
+import argparse
+import os
+import tempfile
+import time
+import pandas as pd
+from config.settings import DATABASE_URL
+from database import get_engine
+from create_db import ensure_schema
+import snapshot
+
+def timed(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - started, result
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare cold-start loads of the answer fact table.")
+    parser.add_argument("--database-url", default=DATABASE_URL, help="Database to load from.")
+    args = parser.parse_args()
+
+    engine = get_engine(args.database_url)
+    ensure_schema(engine)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'fact_table.parquet')
+        export_time, num_rows = timed(snapshot.export_snapshot, engine, path)
+        table_time, _ = timed(pd.read_sql_table, 'client_form_response', engine)
+        sql_time, _ = timed(snapshot.read_fact_table, engine)
+        snapshot_time, frame = timed(snapshot.load_fact_table, engine, path)
+
+    print(f"Fact table: {num_rows:,} rows")
+    print(f"  read_sql_table (all columns): {table_time:8.3f}s")
+    print(f"  SQL fact columns:             {sql_time:8.3f}s")
+    print(f"  Parquet snapshot:             {snapshot_time:8.3f}s  ({table_time / snapshot_time:,.0f}x faster)")
+    print(f"  snapshot export:              {export_time:8.3f}s")
+    print(f"  snapshot memory:              {frame.memory_usage(deep=True).sum() / 2**20:8.1f} MiB")
+
+if __name__ == "__main__":
+    main()
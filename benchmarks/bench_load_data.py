@@ -0,0 +1,46 @@
+# path/benchmarks/bench_load_data.py
+
+import argparse
+import time
+import pandas as pd
+from sqlalchemy import event
+from config.settings import DATABASE_URL, LOAD_WORKERS
+from database import get_engine
+from create_db import ensure_schema
+from concurrent_load import compare_load_times
+import snapshot
+
+# The six reads of the dashboard's load_data, without the Streamlit caches
+def table_loaders(engine):
+    loaders = {name: (lambda name=name: pd.read_sql_table(name, engine))
+               for name in ['client', 'form', 'question', 'response', 'protocol']}
+    loaders['client_form_response'] = lambda: snapshot.read_fact_table(engine)
+    return loaders
+
+# Emulate a networked database by sleeping before every statement, as a round trip would
+def add_latency(engine, latency):
+    @event.listens_for(engine, "before_cursor_execute")
+    def sleep(conn, cursor, statement, parameters, context, executemany):
+        time.sleep(latency)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare serial and concurrent loading of the dashboard tables.")
+    parser.add_argument("--database-url", default=DATABASE_URL, help="Database to load from.")
+    parser.add_argument("--workers", type=int, default=LOAD_WORKERS, help="Threads of the concurrent load.")
+    parser.add_argument("--latency-ms", type=float, default=0, help="Simulated round-trip latency per statement.")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs; the fastest is reported.")
+    args = parser.parse_args()
+
+    engine = get_engine(args.database_url)
+    ensure_schema(engine)
+    if args.latency_ms:
+        add_latency(engine, args.latency_ms / 1000)
+    loaders = table_loaders(engine)
+    serial, concurrent = map(min, zip(*(compare_load_times(loaders, args.workers) for _ in range(args.repeat))))
+
+    print(f"load_data tables ({len(loaders)}), latency {args.latency_ms:g} ms:")
+    print(f"  serial:                 {serial:8.3f}s")
+    print(f"  concurrent ({args.workers} threads): {concurrent:8.3f}s  ({serial / concurrent:.2f}x)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+# path/benchmarks/bench_pages.py
+
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+from config.settings import BASE_DIR
+from database import get_engine
+from create_db import ensure_schema
+from incremental import wait_for_refreshes
+import populate_db
+import queries
+
+try:
+    import psutil
+except ImportError:  # psutil is optional; it is only needed where /proc is missing (e.g. macOS)
+    psutil = None
+
+DEFAULT_SCALES = [1000, 10000, 100000]
+PROC_STATM = '/proc/self/statm'
+
+# Fixture database of a given number of clients, generated with populate_db on first use and brought up to
+# the current schema when reused
+def fixture_database(data_dir, num_clients, seed, regenerate=False):
+    path = os.path.join(data_dir, f"clients_{num_clients}.db")
+    if regenerate:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+    url = f"sqlite:///{path}"
+    if not os.path.exists(path):
+        os.makedirs(data_dir, exist_ok=True)
+        populate_db.main(['--clients', str(num_clients), '--seed', str(seed), '--database-url', url])
+    else:
+        ensure_schema(get_engine(url))
+    return url
+
+# Snapshot the dashboard uses for a fixture database; export one there to benchmark the snapshot cold start
+def fixture_snapshot(data_dir, num_clients):
+    return os.path.join(data_dir, f"clients_{num_clients}.parquet")
+
+APP_PATH = os.path.join(BASE_DIR, 'streamlit_app.py')
+# Seconds AppTest lets one script run take; cold pages at the largest scales take minutes
+APP_TIMEOUT = 3600
+
+# Widget actions on the running dashboard, each followed by the rerun it triggers. A rerun that raises fails
+# the benchmark rather than timing an error page.
+def rerun(element):
+    at = element.run()
+    if at.exception:
+        raise RuntimeError("; ".join(exception.message for exception in at.exception))
+
+def widget(elements, label):
+    for element in elements:
+        if element.label == label:
+            return element
+    raise LookupError(f"No widget labelled {label!r}")
+
+def open_page(page):
+    return lambda at: rerun(widget(at.sidebar.radio, "Go to").set_value(page))
+
+def check(label):
+    return lambda at: rerun(widget(at.checkbox, label).check())
+
+def choose(label, option):
+    return lambda at: rerun(widget(at.radio, label).set_value(option))
+
+def click(label):
+    return lambda at: rerun(widget(at.button, label).click())
+
+def select_middle(label):
+    def action(at):
+        box = widget(at.selectbox, label)
+        rerun(box.set_value(box.options[len(box.options) // 2]))
+    return action
+
+# The client index Client Progress builds on a background thread after its first paint
+def wait_for_background(at):
+    wait_for_refreshes()
+
+# Every step drives the real dashboard (streamlit_app.py, its PAGES declarations and cached accessors) in a
+# fresh AppTest session with the Streamlit caches cleared. The session first draws the default page, then the
+# data caches are cleared again so only the engine stays warm; the setup actions run untimed and the timed
+# actions are measured. Steps: {name: (setup, timed)}.
+STEPS = {
+    'overview_page': ([], [open_page("Overview")]),
+    'change_from_baseline': ([open_page("Overview")], [check("Show Change From Baseline")]),
+    'bootstrap_ci': ([open_page("Overview")], [check("Show 95% CI")]),
+    'form_response_distribution': ([], [open_page("Form Response Distribution")]),
+    # First paint from the per-client query, then the rest of the background load of the client index and a
+    # client switch served from it
+    'client_progress_over_time': ([], [open_page("Client Progress Over Time")]),
+    'client_index': ([open_page("Client Progress Over Time")], [wait_for_background]),
+    'client_switch': ([open_page("Client Progress Over Time"), wait_for_background], [select_middle("Select Client")]),
+    'question_analytics': ([], [open_page("Question Analytics")]),
+    'cohort_comparison': ([], [open_page("Cohort Comparison")]),
+    'data_export': ([open_page("Data Export"), choose("Export Scope", "All Clients")], [click("Prepare CSV Export")]),
+}
+
+def clear_caches():
+    wait_for_refreshes()
+    st.cache_data.clear()
+    st.cache_resource.clear()
+
+# Seconds and peak extra memory of the timed actions of one step, from cold caches
+def run_step(setup, timed):
+    clear_caches()
+    at = AppTest.from_file(APP_PATH, default_timeout=APP_TIMEOUT)
+    rerun(at)
+    st.cache_data.clear()
+    for action in setup:
+        action(at)
+    with PeakMemory() as memory:
+        started = time.perf_counter()
+        for action in timed:
+            action(at)
+        seconds = time.perf_counter() - started
+    return seconds, memory.peak_mib
+
+# Peak resident memory of the process while a block runs, above what it used when the block started, sampled
+# by a background thread. Unlike tracemalloc this adds no per-allocation overhead, which at scale costs more
+# memory than the pages themselves (the SQL reads create tens of millions of small objects). peak_mib stays
+# None when the resident size cannot be read.
+class PeakMemory:
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.peak_mib = None
+
+    def __enter__(self):
+        self.start = self.peak = resident_bytes()
+        if self.start is None:
+            return self
+        self.done = threading.Event()
+        self.thread = threading.Thread(target=self.sample, daemon=True)
+        self.thread.start()
+        return self
+
+    def sample(self):
+        while not self.done.wait(self.interval):
+            self.peak = max(self.peak, resident_bytes())
+
+    def __exit__(self, *exc):
+        if self.start is None:
+            return
+        self.done.set()
+        self.thread.join()
+        self.peak = max(self.peak, resident_bytes())
+        self.peak_mib = (self.peak - self.start) / 2**20
+
+# Resident memory of this process: from /proc on Linux, otherwise from psutil when installed, else None
+def resident_bytes():
+    if os.path.exists(PROC_STATM):
+        with open(PROC_STATM) as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    return None
+
+def format_mib(mib):
+    return f"{mib:8.1f}" if mib is not None else "     n/a"
+
+# Seconds of each step (best of `repeat` runs) and its peak extra memory in MiB (largest over the runs)
+def run_steps(repeat):
+    results = {}
+    for name, (setup, timed) in STEPS.items():
+        runs, peaks = [], []
+        for _ in range(repeat):
+            seconds, peak_mib = run_step(setup, timed)
+            runs.append(seconds)
+            peaks.append(peak_mib)
+        peak_mib = None if None in peaks else round(max(peaks), 1)
+        results[name] = {'seconds': round(min(runs), 4), 'peak_mib': peak_mib}
+    clear_caches()
+    return results
+
+# One scale, run in a fresh process so the peaks are not hidden by memory an earlier scale left mapped. The
+# dashboard reads its database and snapshot from DATABASE_URL and SNAPSHOT_PATH, set by the parent.
+def run_scale(database_url, repeat):
+    engine = get_engine(database_url)
+    return {**table_counts(engine), 'steps': run_steps(repeat)}
+
+def table_counts(engine):
+    counts = queries.summary_counts(engine)
+    return {'clients': counts['clients'], 'answers': counts['answers']}
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# Seconds and peak memory per step of a previous result file next to this one
+def print_comparison(results, baseline):
+    print(f"\nCompared with {baseline.get('commit')} ({baseline.get('created_at')}):")
+    for scale, result in results['scales'].items():
+        previous = baseline['scales'].get(scale)
+        if previous is None:
+            continue
+        print(f"  {int(scale):,} clients")
+        for name, step in result['steps'].items():
+            old = previous['steps'].get(name)
+            if old is None:
+                continue
+            print(f"    {name:<28} {old['seconds']:8.3f}s -> {step['seconds']:8.3f}s "
+                  f"({step['seconds'] / old['seconds']:5.2f}x)  "
+                  f"{format_mib(old.get('peak_mib'))} -> {format_mib(step['peak_mib'])} MiB")
+
+def main():
+    parser = argparse.ArgumentParser(description="Time and measure every dashboard page at scale through AppTest.")
+    parser.add_argument("--clients", type=int, nargs="+", default=DEFAULT_SCALES, help="Scales to benchmark.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the generated databases.")
+    parser.add_argument("--data-dir", default=os.path.join(BASE_DIR, 'data/bench'), help="Fixture databases.")
+    parser.add_argument("--regenerate", action="store_true", help="Rebuild the fixture databases.")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per step; the best is reported.")
+    parser.add_argument("--output", default=None, help="JSON result file (default benchmarks/results/pages_<commit>.json).")
+    parser.add_argument("--compare", default=None, help="Earlier JSON result file to compare against.")
+    args = parser.parse_args()
+
+    commit = git_commit()
+    results = {
+        'benchmark': 'pages',
+        'commit': commit,
+        'created_at': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'repeat': args.repeat,
+        'scales': {},
+    }
+    for num_clients in args.clients:
+        database_url = fixture_database(args.data_dir, num_clients, args.seed, args.regenerate)
+        # Inherited by the spawned process, where the dashboard's settings are first imported
+        os.environ['DATABASE_URL'] = database_url
+        os.environ['SNAPSHOT_PATH'] = fixture_snapshot(args.data_dir, num_clients)
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+            scale = executor.submit(run_scale, database_url, args.repeat).result()
+        results['scales'][str(num_clients)] = scale
+        print(f"{num_clients:,} clients ({scale['answers']:,} answers)")
+        for name, step in scale['steps'].items():
+            print(f"  {name:<28} {step['seconds']:8.3f}s  peak {format_mib(step['peak_mib'])} MiB")
+
+    output = args.output or os.path.join(BASE_DIR, 'benchmarks/results', f"pages_{commit or 'unknown'}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as result_file:
+        json.dump(results, result_file, indent=2)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            print_comparison(results, json.load(baseline_file))
+
+if __name__ == "__main__":
+    main()
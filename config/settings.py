@@ -3,4 +3,63 @@
 import os
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-DATABASE_URL = f"sqlite:///{os.path.join(BASE_DIR, 'data/forms.db')}"
\ No newline at end of file
+
+# Database of the dashboard and the command-line tools; set DATABASE_URL to point them at another one
+DATABASE_URL = os.environ.get("DATABASE_URL", f"sqlite:///{os.path.join(BASE_DIR, 'data/forms.db')}")
+
+# Canonical ordering of the assessment time points
+TIME_POINTS = ["Baseline", "1-Month", "3-Months", "6-Months", "1-Year"]
+
+# Connection pool of the shared engine; every Streamlit session of a server process draws from it
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 10))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 20))
+
+# Seconds a connection waits on a locked SQLite database before raising "database is locked"
+DB_BUSY_TIMEOUT = 30
+
+# Pragmas applied to every SQLite connection. WAL lets readers run concurrently with a writer.
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -64 * 1024,  # negative values are KiB
+    "busy_timeout": DB_BUSY_TIMEOUT * 1000,
+}
+
+# Columnar snapshot of the answer fact table, used for fast cold starts while none of its answers has changed
+SNAPSHOT_PATH = os.environ.get("SNAPSHOT_PATH", os.path.join(BASE_DIR, 'data/fact_table.parquet'))
+
+# Rendered PDF reports, cached by report type, entities and data version
+REPORT_CACHE_DIR = os.path.join(BASE_DIR, 'data/reports')
+
+# CSV exports and batch report ZIPs offered for download. Before a new one is written, files older than
+# EXPORT_MAX_AGE seconds are removed, then the oldest until the rest fit in EXPORT_DIR_MAX_MB. Streamlit reads
+# a download into memory every time its button is drawn, so files above EXPORT_DOWNLOAD_MAX_MB are not offered.
+EXPORT_DIR = os.path.join(BASE_DIR, 'data/exports')
+EXPORT_MAX_AGE = int(os.environ.get("EXPORT_MAX_AGE", 3600))
+EXPORT_DIR_MAX_MB = int(os.environ.get("EXPORT_DIR_MAX_MB", 2048))
+EXPORT_DOWNLOAD_MAX_MB = int(os.environ.get("EXPORT_DOWNLOAD_MAX_MB", 200))
+
+# Worker processes rendering PDF reports in the background
+REPORT_WORKERS = int(os.environ.get("REPORT_WORKERS", min(4, os.cpu_count() or 1)))
+
+# Threads fetching the dashboard tables concurrently on a cold load; 1 loads them one after another
+LOAD_WORKERS = int(os.environ.get("LOAD_WORKERS", 6))
+
+# Port of the Prometheus /metrics endpoint served from the dashboard process; 0 disables it
+PERF_METRICS_PORT = int(os.environ.get("PERF_METRICS_PORT", 0))
+
+# File the performance timings are appended to as JSON lines; unset disables the log
+PERF_LOG_PATH = os.environ.get("PERF_LOG_PATH")
+
+# Change-score tables: a client whose average score moves from Baseline by more than RESPONDER_THRESHOLD
+# percentage points in the improving direction counts as a responder. Improvement is a rising score unless
+# LOWER_SCORES_IMPROVE is set (e.g. for symptom scales).
+RESPONDER_THRESHOLD = float(os.environ.get("RESPONDER_THRESHOLD", 10))
+LOWER_SCORES_IMPROVE = os.environ.get("LOWER_SCORES_IMPROVE", "0") == "1"
+
+# Bootstrap confidence intervals of the time-point means: resamples per interval, the seed that makes them
+# reproducible, and the worker processes large groups are spread over (1 computes everything in-process)
+BOOTSTRAP_RESAMPLES = int(os.environ.get("BOOTSTRAP_RESAMPLES", 1000))
+BOOTSTRAP_SEED = int(os.environ.get("BOOTSTRAP_SEED", 0))
+BOOTSTRAP_WORKERS = int(os.environ.get("BOOTSTRAP_WORKERS", os.cpu_count() or 1))
@@ -0,0 +1,77 @@
+# path/src/aggregations.py
+
+import numpy as np
+import pandas as pd
+from config.settings import TIME_POINTS
+from perf import timed
+
+# Scores are 0-4 Likert answers; charts show them as a percentage of the maximum
+SCORE_MAX = 4
+
+# Sufficient statistics of the scores per (entity, time point): n, sum and sum of squares.
+# One vectorized pass: the group keys are factorized once and the sums are np.bincount reductions.
+# The sums can be added together across batches or read straight from SQL.
+@timed('aggregate:timepoint_sums')
+def timepoint_sums(frame, by):
+    if frame['score'].hasnans:
+        frame = frame[frame['score'].notna()]
+    entity_codes, entities = pd.factorize(frame[by])
+    time_codes, time_points = pd.factorize(frame['time_point'])
+    num_time_points = len(time_points)
+    keys = entity_codes * num_time_points + time_codes
+    size = len(entities) * num_time_points
+
+    scores = frame['score'].to_numpy(dtype=np.float64)
+    n = np.bincount(keys, minlength=size)
+    score_sum = np.bincount(keys, weights=scores, minlength=size)
+    score_sq_sum = np.bincount(keys, weights=scores * scores, minlength=size)
+
+    groups = np.flatnonzero(n)
+    return pd.DataFrame({
+        by: np.asarray(entities)[groups // num_time_points],
+        'time_point': np.asarray(time_points)[groups % num_time_points],
+        'n': n[groups],
+        'score_sum': score_sum[groups].astype(np.int64),
+        'score_sq_sum': score_sq_sum[groups].astype(np.int64),
+    })
+
+# Count, mean and sample standard deviation from the sufficient statistics
+@timed('aggregate:stats_from_sums')
+def stats_from_sums(sums):
+    n = sums['n'].to_numpy(dtype=float)
+    total = sums['score_sum'].to_numpy(dtype=float)
+    mean = total / n
+    with np.errstate(divide='ignore', invalid='ignore'):
+        variance = (sums['score_sq_sum'].to_numpy(dtype=float) - total * mean) / (n - 1)
+    stats = sums.drop(columns=['n', 'score_sum', 'score_sq_sum'])
+    stats['count'] = sums['n'].astype(int)
+    stats['mean'] = mean
+    stats['std'] = np.sqrt(np.where(n > 1, np.clip(variance, 0, None), np.nan))
+    return stats
+
+# Tidy frame used by the time-point charts: one row per (entity, time point) with the entity name,
+# response count, and average score and standard deviation as a percentage of SCORE_MAX
+def timepoint_scores(frame, by, entities):
+    return chart_frame(stats_from_sums(timepoint_sums(frame, by)), by, entities)
+
+# Percent-scale chart columns and entity names for count/mean/std statistics
+@timed('aggregate:chart_frame')
+def chart_frame(stats, by, entities):
+    stats = stats.copy()
+    stats['average_score'] = stats['mean'] * 100 / SCORE_MAX
+    stats['std_dev'] = stats['std'] * 100 / SCORE_MAX
+    stats = stats.merge(entities, left_on=by, right_on='id')
+    stats['time_point'] = pd.Categorical(stats['time_point'], categories=TIME_POINTS, ordered=True)
+    return stats.sort_values(['time_point', by], kind='stable').reset_index(drop=True)
+
+# Average score at the first and last time point of each entity of a chart frame and the change between
+# them (in percentage points), largest changes first
+@timed('aggregate:timepoint_change')
+def timepoint_change(scores, by):
+    grouped = scores.sort_values('time_point', kind='stable').groupby(by, sort=False, observed=True)
+    change = grouped.agg(name=('name', 'first'), first_time_point=('time_point', 'first'),
+                         first_score=('average_score', 'first'), last_time_point=('time_point', 'last'),
+                         last_score=('average_score', 'last'), count=('count', 'sum'))
+    change['change'] = change['last_score'] - change['first_score']
+    return change.reset_index().sort_values('change', key=lambda values: values.abs(), ascending=False,
+                                            ignore_index=True)
@@ -0,0 +1,87 @@
+# path/src/bootstrap.py
+
+import numpy as np
+import pandas as pd
+from config.settings import BOOTSTRAP_RESAMPLES, BOOTSTRAP_SEED
+from aggregations import SCORE_MAX
+from fact_table import time_point_dtype
+from perf import timed
+
+# Bootstrap confidence intervals for the average score per entity and time point, from per-client score sums
+# (queries.client_timepoint_sums). Clients are the resampling unit, as one client's answers are not independent
+# of each other: a resample draws a group's clients with replacement, and its mean is the pooled score_sum / n
+# of the drawn clients, the statistic the time-point charts plot. Each group's generator is seeded from the
+# seed, the entity and the time point, so an interval does not depend on which process computed it.
+
+# Resample indices drawn per chunk; bounds the index matrix of a group at a few tens of MB
+CHUNK_SIZE = 2_000_000
+
+# Groups needing at least this many index draws (clients x resamples) go to the process pool, when one is given
+PARALLEL_MIN_DRAWS = 5_000_000
+
+# Means of `resamples` bootstrap samples of a group's clients, drawn as a (resamples x clients) index matrix
+# a chunk of rows at a time
+def resample_means(n, totals, resamples, seed):
+    rng = np.random.default_rng(seed)
+    num_clients = len(n)
+    means = np.empty(resamples)
+    rows = max(1, CHUNK_SIZE // num_clients)
+    for start in range(0, resamples, rows):
+        indices = rng.integers(0, num_clients, size=(min(rows, resamples - start), num_clients), dtype=np.int32)
+        means[start:start + len(indices)] = totals[indices].sum(axis=1) / n[indices].sum(axis=1)
+    return means
+
+# Percentile interval of a group's mean; undefined for a single client
+def percentile_interval(n, totals, resamples, seed, confidence):
+    if len(n) < 2:
+        return np.nan, np.nan
+    tail = (1 - confidence) / 2
+    lower, upper = np.quantile(resample_means(n, totals, resamples, seed), [tail, 1 - tail])
+    return lower, upper
+
+# Worker entry point: intervals of a batch of (n, totals, seed) groups
+def interval_batch(groups, resamples, confidence):
+    return [percentile_interval(n, totals, resamples, seed, confidence) for n, totals, seed in groups]
+
+# Large groups are submitted to the executor (a workers.spawn_pool) one by one while this process works through
+# the small ones; without an executor every group is computed here
+def run_groups(groups, resamples, confidence, executor=None):
+    large = [position for position, (n, _, _) in enumerate(groups) if len(n) * resamples >= PARALLEL_MIN_DRAWS]
+    if executor is None or not large:
+        return interval_batch(groups, resamples, confidence)
+    jobs = {}
+    for position in large:
+        n, totals, seed = groups[position]
+        jobs[position] = executor.submit(percentile_interval, n, totals, resamples, seed, confidence)
+    small = [position for position in range(len(groups)) if position not in jobs]
+    intervals = dict(zip(small, interval_batch([groups[position] for position in small], resamples, confidence)))
+    intervals.update((position, job.result()) for position, job in jobs.items())
+    return [intervals[position] for position in range(len(groups))]
+
+# Interval per (entity, time point) as a percentage of SCORE_MAX, with the group's answers (n) and clients
+@timed('aggregate:bootstrap_ci')
+def bootstrap_ci(client_sums, by, resamples=BOOTSTRAP_RESAMPLES, confidence=0.95, seed=BOOTSTRAP_SEED,
+                 executor=None):
+    client_sums = client_sums[client_sums['n'] > 0]
+    time_points = client_sums['time_point'].astype(time_point_dtype(client_sums['time_point']))
+    entity_codes, entity_ids = pd.factorize(client_sums[by], sort=True)
+    keys = entity_codes.astype(np.int64) * len(time_points.cat.categories) + time_points.cat.codes.to_numpy()
+    order = np.argsort(keys, kind='stable')
+    group_keys, starts = np.unique(keys[order], return_index=True)
+    # One array of per-client values per group (np.split would return one empty group for no rows)
+    n, totals = ([np.split(client_sums[column].to_numpy(dtype=np.float64)[order], starts[1:]) if len(starts) else []
+                  for column in ('n', 'score_sum')])
+
+    entities = np.asarray(entity_ids)[group_keys // len(time_points.cat.categories)]
+    time_codes = group_keys % len(time_points.cat.categories)
+    seeds = [np.random.SeedSequence([seed, int(entity), int(time_code)])
+             for entity, time_code in zip(entities, time_codes)]
+    intervals = np.array(run_groups(list(zip(n, totals, seeds)), resamples, confidence, executor)).reshape(-1, 2)
+    return pd.DataFrame({
+        by: entities,
+        'time_point': pd.Categorical.from_codes(time_codes, dtype=time_points.dtype),
+        'n': [int(group.sum()) for group in n],
+        'clients': [len(group) for group in n],
+        'ci_lower': intervals[:, 0] * 100 / SCORE_MAX,
+        'ci_upper': intervals[:, 1] * 100 / SCORE_MAX,
+    })
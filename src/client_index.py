@@ -0,0 +1,44 @@
+# path/src/client_index.py
+
+import numpy as np
+import pandas as pd
+
+# Share of the sorted rows the unsorted new rows may reach before they are merged in
+PENDING_FRACTION = 0.1
+
+# Answer rows grouped by client. The frame is sorted by client_id once and the start offset of every
+# client is stored, so looking up one client costs a binary search plus a slice of that client's rows.
+# Rows added later are kept in a small unsorted side frame and scanned on lookup, until it grows large
+# enough to be worth merging into the sorted frame.
+class ClientIndex:
+    def __init__(self, frame, pending=None):
+        order = np.argsort(frame['client_id'].to_numpy(), kind='stable')
+        self.frame = frame.iloc[order].reset_index(drop=True)
+        self.client_ids, starts = np.unique(self.frame['client_id'].to_numpy(), return_index=True)
+        self.offsets = np.append(starts, len(self.frame))
+        self.pending = frame.iloc[0:0] if pending is None else pending
+
+    # Index over these rows plus new ones; returns a new index and leaves this one unchanged
+    def extend(self, rows):
+        if rows.empty:
+            return self
+        pending = pd.concat([self.pending, rows], ignore_index=True)
+        if len(pending) > PENDING_FRACTION * len(self.frame):
+            # The frame is already sorted, so the stable sort only has to merge in the new rows
+            return ClientIndex(pd.concat([self.frame, pending], ignore_index=True))
+        index = ClientIndex.__new__(ClientIndex)
+        index.frame, index.client_ids, index.offsets = self.frame, self.client_ids, self.offsets
+        index.pending = pending
+        return index
+
+    def rows(self, client_id):
+        position = np.searchsorted(self.client_ids, client_id)
+        if position == len(self.client_ids) or self.client_ids[position] != client_id:
+            rows = self.frame.iloc[0:0]
+        else:
+            rows = self.frame.iloc[self.offsets[position]:self.offsets[position + 1]]
+        if len(self.pending):
+            new_rows = self.pending[self.pending['client_id'].to_numpy() == client_id]
+            if len(new_rows):
+                rows = pd.concat([rows, new_rows], ignore_index=True)
+        return rows
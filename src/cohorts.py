@@ -0,0 +1,174 @@
+# path/src/cohorts.py
+
+import re
+from functools import reduce
+import numpy as np
+import pandas as pd
+from perf import timed
+
+# Cohorts of clients defined by the protocols they took, e.g.
+#   PTSD Protocol AND NOT Depression Protocol
+#   "Depression Protocol" AND ("Social Anxiety Protocol" OR "Generalized Anxiety Protocol")
+# Protocol names may be quoted; AND binds tighter than OR, and ALL stands for every client with answers.
+# A parsed definition is a protocol id, 'all', or a tuple ('and', a, b, ...), ('or', a, b, ...) or ('not', a).
+
+OPERATORS = {'AND', 'OR', 'NOT', 'ALL', '(', ')'}
+
+# Operators, parentheses and protocol names; consecutive unquoted words form one name
+def tokenize(text):
+    if text.count('"') % 2:
+        raise ValueError("Unclosed quote in cohort definition.")
+    tokens = []
+    for word in re.findall(r'"[^"]*"|[()]|[^\s()"]+', text):
+        if word.upper() in OPERATORS:
+            tokens.append((word.upper(), word))
+        elif word.startswith('"'):
+            tokens.append(('name', word[1:-1].strip()))
+        elif tokens and tokens[-1][0] == 'words':
+            tokens[-1] = ('words', f"{tokens[-1][1]} {word}")
+        else:
+            tokens.append(('words', word))
+    return tokens
+
+# Recursive descent over the tokens: expression := term (OR term)*, term := factor (AND factor)*,
+# factor := NOT factor | ( expression ) | ALL | protocol name
+class CohortParser:
+    def __init__(self, text, protocol_ids):
+        self.tokens = tokenize(text)
+        self.position = 0
+        self.protocol_ids = {name.lower(): int(protocol_id) for name, protocol_id in protocol_ids.items()}
+
+    def peek(self):
+        return self.tokens[self.position][0] if self.position < len(self.tokens) else None
+
+    def take(self):
+        if self.position == len(self.tokens):
+            raise ValueError("Cohort definition ends unexpectedly.")
+        self.position += 1
+        return self.tokens[self.position - 1]
+
+    def parse(self):
+        if not self.tokens:
+            raise ValueError("Empty cohort definition.")
+        definition = self.expression()
+        if self.position < len(self.tokens):
+            raise ValueError(f"Unexpected '{self.tokens[self.position][1]}' in cohort definition.")
+        return definition
+
+    def expression(self):
+        return self.operands('OR', self.term)
+
+    def term(self):
+        return self.operands('AND', self.factor)
+
+    def operands(self, operator, operand):
+        operands = [operand()]
+        while self.peek() == operator:
+            self.take()
+            operands.append(operand())
+        return operands[0] if len(operands) == 1 else (operator.lower(), *operands)
+
+    def factor(self):
+        kind, value = self.take()
+        if kind == 'NOT':
+            return ('not', self.factor())
+        if kind == '(':
+            definition = self.expression()
+            if self.peek() != ')':
+                raise ValueError("Missing ')' in cohort definition.")
+            self.take()
+            return definition
+        if kind == 'ALL':
+            return 'all'
+        if kind in ('name', 'words'):
+            if value.lower() not in self.protocol_ids:
+                raise ValueError(f"Unknown protocol '{value}'.")
+            return self.protocol_ids[value.lower()]
+        raise ValueError(f"Unexpected '{value}' in cohort definition.")
+
+# protocol_ids maps protocol names (matched case-insensitively) to ids. Raises ValueError on a malformed
+# definition or an unknown protocol.
+def parse_cohort(text, protocol_ids):
+    return CohortParser(text, protocol_ids).parse()
+
+# Protocol membership of every client with answers, as one bitset per protocol over the sorted client ids
+# (packed, one bit per client). A definition is evaluated with a few bitwise operations over #clients / 8
+# bytes, microseconds even for 100k clients, however it is written.
+class ProtocolMembership:
+    def __init__(self, memberships):
+        client_ids = memberships['client_id'].to_numpy()
+        protocol_ids = memberships['protocol_id'].to_numpy()
+        self.client_ids = np.unique(client_ids)
+        positions = np.searchsorted(self.client_ids, client_ids)
+        self.everyone = np.packbits(np.ones(len(self.client_ids), dtype=bool))
+        self.nobody = np.zeros_like(self.everyone)
+        self.bitsets = {}
+        for protocol_id in np.unique(protocol_ids):
+            members = np.zeros(len(self.client_ids), dtype=bool)
+            members[positions[protocol_ids == protocol_id]] = True
+            self.bitsets[int(protocol_id)] = np.packbits(members)
+
+    # Bitset of a parsed definition. Padding bits past the last client stay clear, as NOT is taken
+    # relative to everyone.
+    def evaluate(self, definition):
+        if definition == 'all':
+            return self.everyone
+        if not isinstance(definition, tuple):
+            return self.bitsets.get(int(definition), self.nobody)
+        operator, *operands = definition
+        bitsets = [self.evaluate(operand) for operand in operands]
+        if operator == 'not':
+            return self.everyone & ~bitsets[0]
+        if operator == 'and':
+            return reduce(np.bitwise_and, bitsets)
+        if operator == 'or':
+            return reduce(np.bitwise_or, bitsets)
+        raise ValueError(f"Unknown cohort operator '{operator}'.")
+
+    # One flag per client, in client id order
+    def mask(self, definition):
+        return np.unpackbits(self.evaluate(definition), count=len(self.client_ids)).view(bool)
+
+    def clients(self, definition):
+        return self.client_ids[self.mask(definition)]
+
+    def size(self, definition):
+        return int(np.unpackbits(self.evaluate(definition)).sum())
+
+# Per-client score sums by form and time point (queries.client_timepoint_sums) lined up with a membership's
+# clients, so the sums of a cohort are a row mask and three bincounts rather than a join
+class CohortScores:
+    def __init__(self, client_sums, membership):
+        self.membership = membership
+        # Clients with sums but no membership row cannot be selected; such rows are dropped
+        positions = np.searchsorted(membership.client_ids, client_sums['client_id'].to_numpy())
+        positions = np.minimum(positions, max(len(membership.client_ids) - 1, 0))
+        known = (membership.client_ids[positions] == client_sums['client_id'].to_numpy()
+                 if len(membership.client_ids) else np.zeros(len(client_sums), dtype=bool))
+        client_sums = client_sums[known]
+        self.positions = positions[known]
+        form_codes, self.form_ids = pd.factorize(client_sums['form_id'])
+        time_codes, self.time_points = pd.factorize(client_sums['time_point'])
+        self.keys = form_codes * len(self.time_points) + time_codes
+        self.num_groups = len(self.form_ids) * len(self.time_points)
+        self.sums = {name: client_sums[name].to_numpy(dtype=np.float64) for name in ('n', 'score_sum', 'score_sq_sum')}
+
+    # n, sum and sum of squares per (form, time point) over the clients of a definition, in the columns of
+    # aggregations.timepoint_sums, plus the number of the cohort's clients who answered the form then
+    @timed('aggregate:cohort_sums')
+    def cohort_sums(self, definition):
+        rows = self.membership.mask(definition)[self.positions]
+        keys = self.keys[rows]
+        totals = {name: np.bincount(keys, weights=values[rows], minlength=self.num_groups)
+                  for name, values in self.sums.items()}
+        clients = np.bincount(keys, minlength=self.num_groups)
+        groups = np.flatnonzero(totals['n'])
+        num_time_points = len(self.time_points)
+        return pd.DataFrame({
+            'form_id': np.asarray(self.form_ids)[groups // num_time_points],
+            'time_point': np.asarray(self.time_points)[groups % num_time_points],
+            'n': totals['n'][groups].astype(np.int64),
+            'score_sum': totals['score_sum'][groups].astype(np.int64),
+            'score_sq_sum': totals['score_sq_sum'][groups].astype(np.int64),
+            'clients': clients[groups],
+        })
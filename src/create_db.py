@@ -1,22 +1,13 @@
 # path/src/create_db.py
 
 import os
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, ForeignKey, inspect
-from sqlalchemy.orm import declarative_base, sessionmaker, relationship
+import argparse
+from sqlalchemy import Column, Integer, SmallInteger, String, DateTime, ForeignKey, Index, inspect, text
+from sqlalchemy.orm import declarative_base, relationship
+from sqlalchemy.schema import CreateTable
 import datetime
-from config.settings import DATABASE_URL
-
-# Ensure database file exists
-db_file = DATABASE_URL.split("///")[1]
-if not os.path.exists(db_file):
-    os.makedirs(os.path.dirname(db_file), exist_ok=True)
-    open(db_file, 'w').close()
-
-# Create an engine and session
-engine = create_engine(DATABASE_URL)
-inspector = inspect(engine)
-Session = sessionmaker(bind=engine)
-session = Session()
+from config.settings import DATABASE_URL, TIME_POINTS
+from database import get_engine
 
 Base = declarative_base()
 
@@ -84,9 +75,23 @@ class ClientFormResponse(Base):
     question_id = Column(Integer, ForeignKey('question.id'))
     response_id = Column(Integer, ForeignKey('response.id'))
     time_point = Column(String)
+    # Integer copy of the linked Response.text, so aggregations need neither the join nor string parsing
+    score = Column(SmallInteger)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
 
+    # Dashboard access paths: filter/group by an entity and time point. The form and protocol indexes end in
+    # score, so their aggregations are covering and never touch the table. The client index is not covering:
+    # per-client reads (Client Progress, exports) also select form_id, protocol_id, question_id and score, so
+    # every row found is still fetched from the table, which is cheap for one client's few hundred rows.
+    # Question aggregates have no index of their own (--explain shows a table scan and a temp B-tree for the
+    # GROUP BY); the dashboard reads them from question_timepoint_stats instead.
+    __table_args__ = (
+        Index('ix_client_form_response_client_time', 'client_id', 'time_point', 'response_id'),
+        Index('ix_client_form_response_form_time_score', 'form_id', 'time_point', 'score'),
+        Index('ix_client_form_response_protocol_time_score', 'protocol_id', 'time_point', 'score'),
+    )
+
 class ProtocolForm(Base):
     __tablename__ = 'protocol_form'
     protocol_id = Column(Integer, ForeignKey('protocol.id'), primary_key=True)
@@ -94,6 +99,85 @@ class ProtocolForm(Base):
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
 
+# Compact layout: one narrow row per answer instead of a Response, a QuestionResponse and a ClientFormResponse
+# row with two timestamps each. Time points are stored as ids into a small dimension table. Views with the
+# names and columns of the three tables keep existing reads working (see compat_views).
+class TimePoint(Base):
+    __tablename__ = 'time_point'
+    id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False, unique=True)
+    position = Column(SmallInteger, nullable=False)
+
+class Answer(Base):
+    __tablename__ = 'answer'
+    id = Column(Integer, primary_key=True)
+    client_id = Column(Integer, ForeignKey('client.id'))
+    protocol_id = Column(Integer, ForeignKey('protocol.id'))
+    form_id = Column(Integer, ForeignKey('form.id'))
+    question_id = Column(Integer, ForeignKey('question.id'))
+    time_point_id = Column(SmallInteger, ForeignKey('time_point.id'), nullable=False)
+    score = Column(SmallInteger)
+    # Kept for date-range exports; the only timestamp of the layout
+    answered_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+    __table_args__ = (
+        Index('ix_answer_client_time', 'client_id', 'time_point_id'),
+        Index('ix_answer_form_time_score', 'form_id', 'time_point_id', 'score'),
+        Index('ix_answer_protocol_time_score', 'protocol_id', 'time_point_id', 'score'),
+    )
+
+# Score sums per (form, time point), (protocol, time point) and (question, time point), maintained
+# incrementally by triggers on client_form_response so the dashboard reads O(#entities x #time points) rows
+class FormTimepointStats(Base):
+    __tablename__ = 'form_timepoint_stats'
+    form_id = Column(Integer, ForeignKey('form.id'), primary_key=True)
+    time_point = Column(String, primary_key=True)
+    n = Column(Integer, nullable=False, default=0)
+    score_sum = Column(Integer, nullable=False, default=0)
+    score_sq_sum = Column(Integer, nullable=False, default=0)
+
+class ProtocolTimepointStats(Base):
+    __tablename__ = 'protocol_timepoint_stats'
+    protocol_id = Column(Integer, ForeignKey('protocol.id'), primary_key=True)
+    time_point = Column(String, primary_key=True)
+    n = Column(Integer, nullable=False, default=0)
+    score_sum = Column(Integer, nullable=False, default=0)
+    score_sq_sum = Column(Integer, nullable=False, default=0)
+
+class QuestionTimepointStats(Base):
+    __tablename__ = 'question_timepoint_stats'
+    question_id = Column(Integer, ForeignKey('question.id'), primary_key=True)
+    time_point = Column(String, primary_key=True)
+    n = Column(Integer, nullable=False, default=0)
+    score_sum = Column(Integer, nullable=False, default=0)
+    score_sq_sum = Column(Integer, nullable=False, default=0)
+
+# The same sums per (client, protocol, form, time point), so cohorts of clients can be aggregated without the
+# answers. An answer counts towards the protocol it was given under only, as in protocol_timepoint_stats.
+class ClientTimepointStats(Base):
+    __tablename__ = 'client_timepoint_stats'
+    client_id = Column(Integer, ForeignKey('client.id'), primary_key=True)
+    protocol_id = Column(Integer, ForeignKey('protocol.id'), primary_key=True)
+    form_id = Column(Integer, ForeignKey('form.id'), primary_key=True)
+    time_point = Column(String, primary_key=True)
+    n = Column(Integer, nullable=False, default=0)
+    score_sum = Column(Integer, nullable=False, default=0)
+    score_sq_sum = Column(Integer, nullable=False, default=0)
+
+# Answers per (client, protocol): which protocols each client took, maintained by the same triggers
+class ClientProtocol(Base):
+    __tablename__ = 'client_protocol'
+    client_id = Column(Integer, ForeignKey('client.id'), primary_key=True)
+    protocol_id = Column(Integer, ForeignKey('protocol.id'), primary_key=True)
+    n = Column(Integer, nullable=False, default=0)
+
+# Write counter per table, bumped by triggers on every insert, update and delete. Readers compare
+# versions to tell whether cached or snapshotted data is still current.
+class DataVersion(Base):
+    __tablename__ = 'data_version'
+    table_name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
 # Ensure all tables are created
 tables = [
     ('protocol', Protocol),
@@ -104,14 +188,400 @@ tables = [
     ('response', Response),
     ('question_response', QuestionResponse),
     ('client_form_response', ClientFormResponse),
-    ('protocol_form', ProtocolForm)
+    ('protocol_form', ProtocolForm),
+    ('form_timepoint_stats', FormTimepointStats),
+    ('protocol_timepoint_stats', ProtocolTimepointStats),
+    ('question_timepoint_stats', QuestionTimepointStats),
+    ('client_timepoint_stats', ClientTimepointStats),
+    ('client_protocol', ClientProtocol),
+    ('data_version', DataVersion)
 ]
 
-try:
-    for table_name, table_class in tables:
+# Compact layout: the answer tables above are replaced by these views over answer and time_point
+compat_views = {
+    'client_form_response': (
+        "SELECT answer.id AS id, answer.client_id AS client_id, answer.form_id AS form_id, "
+        "answer.protocol_id AS protocol_id, answer.question_id AS question_id, answer.id AS response_id, "
+        "time_point.name AS time_point, answer.score AS score, answer.answered_at AS created_at, "
+        "NULL AS updated_at FROM answer JOIN time_point ON time_point.id = answer.time_point_id"
+    ),
+    'response': (
+        "SELECT id, CAST(score AS TEXT) AS text, answered_at AS created_at, NULL AS updated_at FROM answer"
+    ),
+    'question_response': (
+        "SELECT id, question_id AS question, id AS response, answered_at AS created_at, NULL AS updated_at "
+        "FROM answer"
+    ),
+}
+compact_tables = (
+    [('time_point', TimePoint), ('answer', Answer)]
+    + [(table_name, table_class) for table_name, table_class in tables if table_name not in compat_views]
+)
+
+
+# Tables whose writes bump their data_version counter: every table the dashboard loads
+versioned_tables = [
+    'protocol', 'client', 'form', 'question', 'form_question', 'response', 'question_response',
+    'client_form_response', 'protocol_form',
+]
+
+# Append-mostly tables the dashboard loads incrementally by id, and the data_version counter bumped by their
+# updates and deletes (not by inserts). While its counter stands still, a loaded copy only lacks the rows above
+# its highest id. In the compact layout both are views over answer, whose updates and deletes bump both.
+update_counters = {'client_form_response': 'client_form_response_updates', 'response': 'response_updates'}
+incremental_tables = list(update_counters)
+
+# Counters read for the compact views; their own counters would never move
+version_aliases = {'response': 'client_form_response', 'question_response': 'client_form_response'}
+
+def is_compact(engine):
+    return inspect(engine).has_table('answer')
+
+def schema_tables(engine):
+    return compact_tables if is_compact(engine) else tables
+
+# Summary table -> the client_form_response columns it is keyed on (together with time_point)
+summary_tables = {
+    'form_timepoint_stats': ('form_id',),
+    'protocol_timepoint_stats': ('protocol_id',),
+    'question_timepoint_stats': ('question_id',),
+    'client_timepoint_stats': ('client_id', 'protocol_id', 'form_id'),
+}
+
+# One-time backfills for columns added to existing databases, run right after the column is created
+column_backfills = {
+    ('client_form_response', 'score'): (
+        "UPDATE client_form_response SET score = "
+        "(SELECT CAST(response.text AS INTEGER) FROM response WHERE response.id = client_form_response.response_id)"
+    ),
+}
+
+# Indexes superseded by the ones declared on the models
+retired_indexes = [
+    'ix_client_form_response_form_time',
+    'ix_client_form_response_protocol_time',
+    'ix_client_form_response_updated_at',
+    'ix_response_updated_at',
+]
+
+# Triggers no longer created; ensure_triggers drops them from existing databases
+retired_triggers = [
+    'trg_client_form_response_touch_insert',
+    'trg_client_form_response_touch_update',
+    'trg_response_touch_insert',
+    'trg_response_touch_update',
+]
+
+# Add columns declared on the models that are missing from an existing database
+def ensure_columns(engine):
+    inspector = inspect(engine)
+    for table_name, table_class in schema_tables(engine):
+        existing = {column['name'] for column in inspector.get_columns(table_name)}
+        for column in table_class.__table__.columns:
+            if column.name in existing:
+                continue
+            column_type = column.type.compile(dialect=engine.dialect)
+            with engine.begin() as conn:
+                conn.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {column.name} {column_type}"))
+                backfill = column_backfills.get((table_name, column.name))
+                if backfill:
+                    conn.execute(text(backfill))
+            print(f"Column '{table_name}.{column.name}' added successfully.")
+
+# Add indexes declared on the models that are missing from an existing database
+def ensure_indexes(engine):
+    inspector = inspect(engine)
+    model_tables = schema_tables(engine)
+    existing = {index['name'] for table_name, _ in model_tables for index in inspector.get_indexes(table_name)}
+    with engine.begin() as conn:
+        for index_name in retired_indexes:
+            if index_name in existing:
+                conn.execute(text(f"DROP INDEX {index_name}"))
+                print(f"Index '{index_name}' dropped.")
+    for _, table_class in model_tables:
+        for index in table_class.__table__.indexes:
+            if index.name not in existing:
+                index.create(engine)
+                print(f"Index '{index.name}' created successfully.")
+
+# Time point name of a trigger's NEW or OLD answer row
+def row_time_point(row, compact):
+    return f"(SELECT name FROM time_point WHERE id = {row}.time_point_id)" if compact else f"{row}.time_point"
+
+# Statements adding an answer row (NEW) to, or removing one (OLD) from, a summary table.
+# Rows without a score are not counted, matching COUNT(score)/SUM(score).
+def add_to_summary(table_name, keys, compact=False):
+    columns = ", ".join(keys)
+    return (
+        f"INSERT INTO {table_name} ({columns}, time_point, n, score_sum, score_sq_sum) "
+        f"SELECT {', '.join(f'NEW.{key}' for key in keys)}, {row_time_point('NEW', compact)}, 1, NEW.score, "
+        f"NEW.score * NEW.score WHERE NEW.score IS NOT NULL "
+        f"ON CONFLICT ({columns}, time_point) DO UPDATE SET n = n + 1, "
+        f"score_sum = score_sum + excluded.score_sum, score_sq_sum = score_sq_sum + excluded.score_sq_sum;"
+    )
+
+def remove_from_summary(table_name, keys, compact=False):
+    return (
+        f"UPDATE {table_name} SET n = n - 1, score_sum = score_sum - OLD.score, "
+        f"score_sq_sum = score_sq_sum - OLD.score * OLD.score "
+        f"WHERE {' AND '.join(f'{key} = OLD.{key}' for key in keys)} "
+        f"AND time_point = {row_time_point('OLD', compact)} AND OLD.score IS NOT NULL;"
+    )
+
+# Membership counts every answer, scored or not; rows of clients who no longer have answers to a protocol
+# stay behind with n = 0
+def add_to_membership():
+    return (
+        "INSERT INTO client_protocol (client_id, protocol_id, n) SELECT NEW.client_id, NEW.protocol_id, 1 "
+        "WHERE NEW.client_id IS NOT NULL AND NEW.protocol_id IS NOT NULL "
+        "ON CONFLICT (client_id, protocol_id) DO UPDATE SET n = n + 1;"
+    )
+
+def remove_from_membership():
+    return "UPDATE client_protocol SET n = n - 1 WHERE client_id = OLD.client_id AND protocol_id = OLD.protocol_id;"
+
+def summary_triggers(compact=False):
+    answers, time_point = ('answer', 'time_point_id') if compact else ('client_form_response', 'time_point')
+    insert_steps = " ".join([add_to_summary(table_name, keys, compact) for table_name, keys in summary_tables.items()]
+                            + [add_to_membership()])
+    delete_steps = " ".join([remove_from_summary(table_name, keys, compact)
+                             for table_name, keys in summary_tables.items()] + [remove_from_membership()])
+    return {
+        f'trg_{answers}_stats_insert': f"AFTER INSERT ON {answers} BEGIN {insert_steps} END",
+        f'trg_{answers}_stats_delete': f"AFTER DELETE ON {answers} BEGIN {delete_steps} END",
+        f'trg_{answers}_stats_update': (
+            f"AFTER UPDATE OF client_id, form_id, protocol_id, question_id, {time_point}, score ON {answers} "
+            f"BEGIN {delete_steps} {insert_steps} END"
+        ),
+    }
+
+def bump_version(table_name):
+    return (
+        f"INSERT INTO data_version (table_name, version) VALUES ('{table_name}', 1) "
+        f"ON CONFLICT (table_name) DO UPDATE SET version = version + 1;"
+    )
+
+def version_tables(compact=False):
+    return [table_name for table_name in versioned_tables if not (compact and table_name in compat_views)]
+
+# Updates and deletes of the incremental tables also bump their update counter. In the compact layout writes to
+# answer bump client_form_response, and its updates and deletes bump the counters of both views.
+def version_triggers(compact=False):
+    version_triggers = {}
+    for table_name in version_tables(compact):
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            steps = bump_version(table_name)
+            if event != 'INSERT' and table_name in update_counters:
+                steps += bump_version(update_counters[table_name])
+            version_triggers[f"trg_{table_name}_version_{event.lower()}"] = (
+                f"AFTER {event} ON {table_name} BEGIN {steps} END"
+            )
+    if compact:
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            steps = bump_version('client_form_response')
+            if event != 'INSERT':
+                steps += "".join(bump_version(counter) for counter in update_counters.values())
+            version_triggers[f"trg_answer_version_{event.lower()}"] = f"AFTER {event} ON answer BEGIN {steps} END"
+    return version_triggers
+
+def triggers(compact=False):
+    return {**summary_triggers(compact), **version_triggers(compact)}
+
+# Create missing triggers, replace ones whose definition has changed since they were created and drop retired ones
+def ensure_triggers(engine):
+    with engine.begin() as conn:
+        existing = dict(conn.execute(text("SELECT name, sql FROM sqlite_master WHERE type = 'trigger'")).all())
+        for trigger_name in retired_triggers:
+            if trigger_name in existing:
+                conn.execute(text(f"DROP TRIGGER {trigger_name}"))
+                print(f"Trigger '{trigger_name}' dropped.")
+        for trigger_name, body in triggers(is_compact(engine)).items():
+            if trigger_name in existing and not existing[trigger_name].endswith(body):
+                conn.execute(text(f"DROP TRIGGER {trigger_name}"))
+                print(f"Trigger '{trigger_name}' replaced.")
+            conn.execute(text(f"CREATE TRIGGER IF NOT EXISTS {trigger_name} {body}"))
+
+# Bulk loads drop the per-row triggers, then call rebuild_summaries() and bump_versions() once they are done
+def drop_triggers(engine):
+    with engine.begin() as conn:
+        for trigger_name in triggers(is_compact(engine)):
+            conn.execute(text(f"DROP TRIGGER IF EXISTS {trigger_name}"))
+
+def bump_versions(engine, table_names=None):
+    with engine.begin() as conn:
+        for table_name in table_names or version_tables(is_compact(engine)):
+            conn.execute(text(bump_version(table_name)))
+
+# Recompute every summary table and the protocol membership from client_form_response in a single transaction
+def rebuild_summaries(engine):
+    with engine.begin() as conn:
+        for table_name, keys in summary_tables.items():
+            columns = ", ".join(keys)
+            conn.execute(text(f"DELETE FROM {table_name}"))
+            conn.execute(text(
+                f"INSERT INTO {table_name} ({columns}, time_point, n, score_sum, score_sq_sum) "
+                f"SELECT {columns}, time_point, COUNT(score), SUM(score), SUM(score * score) "
+                f"FROM client_form_response WHERE score IS NOT NULL GROUP BY {columns}, time_point"
+            ))
+        conn.execute(text("DELETE FROM client_protocol"))
+        conn.execute(text(
+            "INSERT INTO client_protocol (client_id, protocol_id, n) SELECT client_id, protocol_id, COUNT(*) "
+            "FROM client_form_response WHERE client_id IS NOT NULL AND protocol_id IS NOT NULL "
+            "GROUP BY client_id, protocol_id"
+        ))
+
+# Ids of time point names in the compact layout, adding names not seen before after the existing ones
+def time_point_ids(conn, names):
+    ids = dict(conn.execute(text("SELECT name, id FROM time_point")).all())
+    missing = [name for name in dict.fromkeys(names) if name not in ids]
+    if missing:
+        start = conn.execute(text("SELECT COALESCE(MAX(id), 0) FROM time_point")).scalar() + 1
+        conn.execute(TimePoint.__table__.insert(), [{'id': start + i, 'name': name, 'position': start + i}
+                                                    for i, name in enumerate(missing)])
+        ids.update({name: start + i for i, name in enumerate(missing)})
+    return ids
+
+def ensure_views(engine):
+    with engine.begin() as conn:
+        for view_name, body in compat_views.items():
+            conn.execute(text(f"CREATE VIEW IF NOT EXISTS {view_name} AS {body}"))
+
+# Summary tables are derived data: one missing a key column is dropped, and recreated and rebuilt by
+# ensure_schema, rather than migrated
+def drop_outdated_summaries(engine):
+    inspector = inspect(engine)
+    for table_name, keys in summary_tables.items():
+        if not inspector.has_table(table_name):
+            continue
+        columns = {column['name'] for column in inspector.get_columns(table_name)}
+        if not set(keys) <= columns:
+            with engine.begin() as conn:
+                conn.execute(text(f"DROP TABLE {table_name}"))
+            print(f"Table '{table_name}' dropped to be rebuilt with its new key.")
+
+# SQLite creates a missing database file on connect, but not the directory it goes in
+def ensure_database_dir(engine):
+    database = engine.url.database
+    if engine.url.get_backend_name() == 'sqlite' and database and database != ':memory:':
+        os.makedirs(os.path.dirname(os.path.abspath(database)), exist_ok=True)
+
+# Create missing tables, columns, indexes and triggers. A new database gets the compact layout when `compact`
+# is set; an existing one keeps its layout (see migrate_to_compact).
+def ensure_schema(engine, compact=False):
+    ensure_database_dir(engine)
+    drop_outdated_summaries(engine)
+    inspector = inspect(engine)
+    compact = is_compact(engine) or (compact and not inspector.has_table('client_form_response'))
+    created = set()
+    for table_name, table_class in compact_tables if compact else tables:
         if not inspector.has_table(table_name):
             table_class.__table__.create(engine)
+            created.add(table_name)
             print(f"Table '{table_name}' created successfully.")
+    if compact:
+        if 'time_point' in created:
+            with engine.begin() as conn:
+                time_point_ids(conn, TIME_POINTS)
+        ensure_views(engine)
+    ensure_columns(engine)
+    ensure_indexes(engine)
+    ensure_triggers(engine)
+    if created & {*summary_tables, 'client_protocol'}:
+        rebuild_summaries(engine)
+
+# Move an existing database to the compact layout in one transaction: answers are copied into answer (keeping
+# their ids, so response_id in the views is the answer id), the three tables are dropped and replaced by the
+# compatibility views. Indexes are built after the copy. Returns the number of answers moved (0 when the
+# database is already compact).
+def migrate_to_compact(engine):
+    if is_compact(engine):
+        return 0
+    answer_table = Answer.__table__
+    ensure_schema(engine)
+    drop_triggers(engine)
+    with engine.begin() as conn:
+        missing = conn.execute(text("SELECT COUNT(*) FROM client_form_response WHERE time_point IS NULL")).scalar()
+        if missing:
+            raise ValueError(f"{missing} answers have no time point; fill them in before migrating.")
+        TimePoint.__table__.create(conn)
+        time_points = conn.execute(text("SELECT DISTINCT time_point FROM client_form_response")).scalars().all()
+        time_point_ids(conn, TIME_POINTS + sorted(set(time_points) - set(TIME_POINTS)))
+        conn.execute(CreateTable(answer_table))
+        num_answers = conn.execute(text(
+            "INSERT INTO answer (id, client_id, protocol_id, form_id, question_id, time_point_id, score, answered_at) "
+            "SELECT c.id, c.client_id, c.protocol_id, c.form_id, c.question_id, t.id, c.score, c.created_at "
+            "FROM client_form_response c JOIN time_point t ON t.name = c.time_point ORDER BY c.id"
+        )).rowcount
+        for index in answer_table.indexes:
+            index.create(conn)
+        for table_name in compat_views:
+            conn.execute(text(f"DROP TABLE {table_name}"))
+            conn.execute(text(f"CREATE VIEW {table_name} AS {compat_views[table_name]}"))
+        conn.execute(text("DELETE FROM data_version WHERE table_name IN ('response', 'question_response')"))
+    ensure_triggers(engine)
+    bump_versions(engine, ['client_form_response'])
+    return num_answers
+
+# Typical dashboard queries, used to check that the indexes above are picked up by the planner
+dashboard_queries = {
+    "Scores per form and time point": (
+        "SELECT form_id, time_point, COUNT(*), AVG(score) FROM client_form_response GROUP BY form_id, time_point"
+    ),
+    "Scores per protocol and time point": (
+        "SELECT protocol_id, time_point, COUNT(*), AVG(score) FROM client_form_response "
+        "GROUP BY protocol_id, time_point"
+    ),
+    "Scores per question and time point": (
+        "SELECT question_id, time_point, COUNT(score), SUM(score) FROM client_form_response "
+        "GROUP BY question_id, time_point"
+    ),
+    "Rows of one client": (
+        "SELECT id, client_id, form_id, protocol_id, question_id, response_id, time_point, score "
+        "FROM client_form_response WHERE client_id = 1"
+    ),
+    "One form at one time point": (
+        "SELECT COUNT(*) FROM client_form_response WHERE form_id = 1 AND time_point = 'Baseline'"
+    ),
+}
+
+def explain_query_plan(engine, sql):
+    with engine.connect() as conn:
+        return [row[-1] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"))]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create or migrate the dashboard database.")
+    parser.add_argument("--explain", action="store_true", help="Print the query plans of typical dashboard queries.")
+    parser.add_argument("--rebuild-stats", action="store_true", help="Recompute the summary tables from scratch.")
+    parser.add_argument("--compact", action="store_true",
+                        help="Migrate to the compact answer layout (one narrow fact table behind views).")
+    parser.add_argument("--vacuum", action="store_true", help="Reclaim the space freed by --compact.")
+    parser.add_argument("--database-url", default=DATABASE_URL, help="Database to create or migrate.")
+    args = parser.parse_args()
+
+    engine = get_engine(args.database_url)
+    ensure_schema(engine)
     print("DB integrity check... All necessary tables are ensured to exist.")
-except Exception as e:
-    print(f"Error creating tables: {e}")
+    db_file = engine.url.database
+
+    if args.compact:
+        if is_compact(engine):
+            print("Database already uses the compact layout.")
+        else:
+            print(f"{migrate_to_compact(engine):,} answers moved to the compact layout.")
+    if args.vacuum:
+        size = os.path.getsize(db_file)
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text("VACUUM"))
+            # In WAL mode the rewritten pages only reach the database file at a checkpoint
+            conn.execute(text("PRAGMA wal_checkpoint(TRUNCATE)"))
+        print(f"Database file {size / 2**20:,.1f} MiB -> {os.path.getsize(db_file) / 2**20:,.1f} MiB.")
+
+    if args.rebuild_stats:
+        rebuild_summaries(engine)
+        print("Summary tables rebuilt.")
+
+    if args.explain:
+        for description, sql in dashboard_queries.items():
+            print(f"\n{description}:")
+            for step in explain_query_plan(engine, sql):
+                print(f"  {step}")
@@ -0,0 +1,21 @@
+# path/src/database.py
+
+from functools import lru_cache
+from sqlalchemy import create_engine, event
+from config.settings import DATABASE_URL, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_BUSY_TIMEOUT, SQLITE_PRAGMAS
+
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+# One pooled engine per process and database URL; the app, scripts and query modules all share it
+@lru_cache(maxsize=None)
+def get_engine(url=DATABASE_URL):
+    if url.startswith("sqlite"):
+        engine = create_engine(url, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW,
+                               connect_args={"timeout": DB_BUSY_TIMEOUT})
+        event.listen(engine, "connect", apply_sqlite_pragmas)
+        return engine
+    return create_engine(url, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_pre_ping=True)
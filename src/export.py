@@ -0,0 +1,88 @@
+# path/src/export.py
+
+import os
+import time
+import tempfile
+import datetime
+import gzip
+import pandas as pd
+from sqlalchemy import select
+from create_db import Client, Form, Protocol, Question, Response, ClientFormResponse
+
+client_form_response = ClientFormResponse.__table__
+
+# Columns available in CSV exports, by their header in the file
+EXPORT_COLUMNS = {
+    'Client Name': Client.__table__.c.name,
+    'Email': Client.__table__.c.email,
+    'Form Name': Form.__table__.c.name,
+    'Protocol Name': Protocol.__table__.c.name,
+    'Question Text': Question.__table__.c.text,
+    'Response Text': Response.__table__.c.text,
+    'Score': client_form_response.c.score,
+    'Time Point': client_form_response.c.time_point,
+    'Answered At': client_form_response.c.created_at,
+}
+DEFAULT_EXPORT_COLUMNS = ['Client Name', 'Email', 'Form Name', 'Protocol Name', 'Question Text', 'Response Text', 'Time Point']
+
+# Joined answer rows for an export scope: some clients, some protocols and/or answers within [start, end] dates
+def export_query(columns, client_ids=None, protocol_ids=None, start=None, end=None):
+    joined = client_form_response
+    for model, column in ((Client, 'client_id'), (Form, 'form_id'), (Protocol, 'protocol_id'),
+                          (Question, 'question_id'), (Response, 'response_id')):
+        joined = joined.outerjoin(model.__table__, model.__table__.c.id == client_form_response.c[column])
+    query = select(*(EXPORT_COLUMNS[column].label(column) for column in columns)).select_from(joined)
+    if client_ids is not None:
+        query = query.where(client_form_response.c.client_id.in_([int(value) for value in client_ids]))
+    if protocol_ids is not None:
+        query = query.where(client_form_response.c.protocol_id.in_([int(value) for value in protocol_ids]))
+    if start is not None:
+        query = query.where(client_form_response.c.created_at >= start)
+    if end is not None:
+        query = query.where(client_form_response.c.created_at < end + datetime.timedelta(days=1))
+    return query.order_by(client_form_response.c.id)
+
+# Stream the query result into a (optionally gzip-compressed) CSV file, chunksize rows at a time, so memory
+# stays bounded by one chunk whatever the size of the export. Returns the number of rows written.
+def write_csv(engine, query, path, compress=False, chunksize=50_000):
+    num_rows = 0
+    opener = gzip.open if compress else open
+    with opener(path, 'wt', newline='') as csv_file, \
+            engine.connect().execution_options(stream_results=True) as conn:
+        for chunk in pd.read_sql(query, conn, chunksize=chunksize):
+            chunk.to_csv(csv_file, header=num_rows == 0, index=False)
+            num_rows += len(chunk)
+        if num_rows == 0:
+            pd.DataFrame(columns=[column.name for column in query.selected_columns]).to_csv(csv_file, index=False)
+    return num_rows
+
+# Remove the files of an export directory older than max_age seconds, then the oldest ones until the rest
+# take at most max_bytes. Returns the number of files removed.
+def prune_exports(directory, max_age, max_bytes):
+    files = []
+    for entry in os.scandir(directory):
+        if entry.is_file():
+            stat = entry.stat()
+            files.append((stat.st_mtime, stat.st_size, entry.path))
+    files.sort(reverse=True)
+    cutoff = time.time() - max_age
+    kept_bytes = 0
+    removed = 0
+    for mtime, size, path in files:
+        if mtime >= cutoff and kept_bytes + size <= max_bytes:
+            kept_bytes += size
+            continue
+        try:
+            os.remove(path)
+            removed += 1
+        except FileNotFoundError:  # pruned by another session meanwhile
+            pass
+    return removed
+
+# Path of a new, empty file in the export directory, created after pruning it
+def new_export_path(directory, suffix, max_age, max_bytes):
+    os.makedirs(directory, exist_ok=True)
+    prune_exports(directory, max_age, max_bytes)
+    fd, path = tempfile.mkstemp(suffix=suffix, dir=directory)
+    os.close(fd)
+    return path
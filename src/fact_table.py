@@ -0,0 +1,56 @@
+# path/src/fact_table.py
+
+import numpy as np
+import pandas as pd
+from config.settings import TIME_POINTS
+
+INTEGER_DTYPES = [np.int8, np.int16, np.int32, np.int64]
+
+# Smallest signed integer dtype holding every value of an id column
+def smallest_int_dtype(values):
+    if len(values) == 0:
+        return np.int32
+    low, high = values.min(), values.max()
+    return next(dtype for dtype in INTEGER_DTYPES if np.iinfo(dtype).min <= low and high <= np.iinfo(dtype).max)
+
+# Ordered categorical over the canonical time points, followed by any other time points in the data
+def time_point_dtype(time_points):
+    extra = [time_point for time_point in pd.unique(time_points.astype(object)) if time_point not in TIME_POINTS]
+    return pd.CategoricalDtype(TIME_POINTS + [time_point for time_point in extra if pd.notna(time_point)], ordered=True)
+
+# Narrowest in-memory representation of the answer fact table: downcast ids, int8 scores (nullable Int8 only
+# when a score is missing) and time_point as an ordered categorical
+def compact_fact_table(frame):
+    compact = {}
+    for column in frame.columns:
+        values = frame[column]
+        if column == 'time_point':
+            compact[column] = values.astype(time_point_dtype(values))
+        elif column == 'score':
+            compact[column] = values.astype('Int8' if values.isna().any() else np.int8)
+        else:
+            compact[column] = values.astype(smallest_int_dtype(values.to_numpy()))
+    return pd.DataFrame(compact)
+
+# Whether values can be cast to a dtype of the compact table without losing information
+def fits_dtype(values, dtype):
+    if isinstance(dtype, pd.CategoricalDtype):
+        return values.dropna().isin(dtype.categories).all()
+    if values.isna().any():
+        return isinstance(dtype, pd.api.extensions.ExtensionDtype)
+    if len(values) == 0:
+        return True
+    info = np.iinfo(getattr(dtype, 'numpy_dtype', dtype))
+    return info.min <= values.min() and values.max() <= info.max
+
+# Append rows to a compact fact table. New rows are cast to the table's dtypes; only when they do not fit
+# (a larger id, a missing score or an unseen time point) is the combined table compacted again.
+def append_compact(frame, rows):
+    if rows.empty:
+        return frame
+    if all(fits_dtype(rows[column], dtype) for column, dtype in frame.dtypes.items()):
+        return pd.concat([frame, rows.astype(frame.dtypes.to_dict())], ignore_index=True)
+    return compact_fact_table(pd.concat([frame, rows], ignore_index=True))
+
+def memory_mib(frame):
+    return frame.memory_usage(deep=True).sum() / 2**20
@@ -0,0 +1,44 @@
+# path/src/figures.py
+
+import plotly.express as px
+from perf import timed
+
+# Figures shared by the dashboard pages and the PDF reports, built from aggregations.chart_frame output
+
+# Average score per time point, one line per entity, with optional variance bars, confidence intervals, counts
+# and percentages. Counts and percentages are one text trace each rather than an annotation per point.
+@timed('figure:timepoint_line_chart')
+def timepoint_line_chart(scores, legend, show_variance=False, show_counts=False, show_percentages=False,
+                         show_ci=False):
+    fig = px.line(scores, x='time_point', y='average_score', color='name',
+                  labels={'time_point': 'Time Point', 'average_score': 'Average Score (%)', 'name': legend})
+
+    if show_variance:
+        for name, entity_data in scores.groupby('name', sort=False, observed=True):
+            fig.add_scatter(x=entity_data['time_point'], y=entity_data['average_score'],
+                            error_y=dict(type='data', array=entity_data['std_dev']),
+                            mode='markers', name=f"{name} (Variance)")
+    # Confidence intervals need ci_lower and ci_upper columns (bootstrap.bootstrap_ci); they need not be
+    # symmetric around the mean
+    if show_ci:
+        for name, entity_data in scores.groupby('name', sort=False, observed=True):
+            above = (entity_data['ci_upper'] - entity_data['average_score']).clip(lower=0)
+            below = (entity_data['average_score'] - entity_data['ci_lower']).clip(lower=0)
+            fig.add_scatter(x=entity_data['time_point'], y=entity_data['average_score'],
+                            error_y=dict(type='data', symmetric=False, array=above, arrayminus=below),
+                            mode='markers', name=f"{name} (95% CI)")
+    if show_counts:
+        add_labels(fig, scores, "N=" + scores['count'].astype(str), 'top center')
+    if show_percentages:
+        add_labels(fig, scores, scores['average_score'].map("{:.2f}%".format), 'bottom center')
+    return fig
+
+def add_labels(fig, scores, text, position):
+    fig.add_scatter(x=scores['time_point'], y=scores['average_score'], text=text, mode='text',
+                    textposition=position, showlegend=False, hoverinfo='skip')
+
+# Histogram of raw response scores
+@timed('figure:score_histogram')
+def score_histogram(scores):
+    frame = scores.to_frame(name='Response Score')
+    return px.histogram(frame, x='Response Score', nbins=10, labels={'Response Score': 'Response Score'})
@@ -0,0 +1,134 @@
+# path/src/incremental.py
+
+import threading
+import pandas as pd
+from sqlalchemy import select, text
+import perf
+
+def concat_rows(frame, rows):
+    return pd.concat([frame, rows], ignore_index=True) if len(rows) else frame
+
+# In-memory copy of an append-mostly table with an integer id, kept current by fetching only the rows above
+# the highest id already loaded (the watermark). Derived aggregates are extended with the new rows instead of
+# being rebuilt. Updated and deleted rows cannot be folded in: triggers bump the table's update counter in
+# data_version on every update and delete (create_db.update_counters), and a counter that moved since the last
+# load causes a full reload. SQLite hands out new ids above every committed one, so while the counter stands
+# still the rows above the watermark are all that is missing.
+#
+# load(engine) reads the table, or any prefix of it by id (e.g. a snapshot): the rows above its highest id are
+# fetched right after. append(frame, rows) adds new rows to it, and aggregates maps names to types built from
+# the frame and with an extend(rows) method, e.g. {'client_index': ClientIndex}.
+class IncrementalTable:
+    def __init__(self, engine, table, update_counter, columns=None, load=None, append=concat_rows,
+                 aggregates=None):
+        self.engine = engine
+        self.table = table
+        self.update_counter = update_counter
+        self.columns = columns or [column.name for column in table.columns]
+        self.load = load or self.read_all
+        self.append = append
+        self.aggregate_types = aggregates or {}
+        self.lock = threading.Lock()
+        self.full_reloads = 0
+        self.reload()
+
+    def rows_query(self):
+        return select(*(self.table.c[column] for column in self.columns)).order_by(self.table.c.id)
+
+    def read_all(self, engine):
+        with engine.connect() as conn:
+            return pd.read_sql(self.rows_query(), conn)
+
+    def read_update_count(self, conn):
+        query = text("SELECT version FROM data_version WHERE table_name = :name")
+        return conn.execute(query, {'name': self.update_counter}).scalar() or 0
+
+    # The counter is read before the rows, so an update or delete landing in between moves it past the value
+    # stored here and is caught by the next refresh
+    def reload(self):
+        with self.engine.connect() as conn:
+            self.update_count = self.read_update_count(conn)
+        frame = self.load(self.engine)
+        self.set_state(frame, {name: build(frame) for name, build in self.aggregate_types.items()})
+        self.full_reloads += 1
+        perf.count(f"{self.table.name}:full_reloads")
+
+    def set_state(self, frame, aggregates):
+        self.frame = frame
+        self.aggregates = aggregates
+        self.watermark = int(frame['id'].max()) if len(frame) else 0
+        self.num_rows = len(frame)
+
+    def append_rows(self, rows):
+        frame = self.append(self.frame, rows)
+        # Aggregates take the new rows in the frame's representation; if appending changed it, they are
+        # rebuilt rather than extended
+        if frame.dtypes.equals(self.frame.dtypes):
+            new_rows = frame.iloc[self.num_rows:]
+            aggregates = {name: aggregate.extend(new_rows) for name, aggregate in self.aggregates.items()}
+        else:
+            aggregates = {name: build(frame) for name, build in self.aggregate_types.items()}
+        self.set_state(frame, aggregates)
+        perf.count(f"{self.table.name}:rows_appended", len(rows))
+        print(f"{self.table.name}: appended {len(rows):,} new rows.")
+
+    # Bring the copy up to date and return (frame, aggregates). Both are replaced, never modified, so
+    # callers holding an earlier pair keep a consistent view. As in reload, the counter is read before the
+    # new rows are fetched.
+    def refresh(self):
+        with self.lock:
+            with self.engine.connect() as conn:
+                changed = self.read_update_count(conn) != self.update_count
+            if changed:
+                self.reload()
+                print(f"{self.table.name}: rows updated or deleted, reloaded {self.num_rows:,} rows.")
+            with self.engine.connect() as conn:
+                rows = pd.read_sql(self.rows_query().where(self.table.c.id > self.watermark), conn)
+            if len(rows):
+                self.append_rows(rows)
+            return self.frame, self.aggregates
+
+# Name of the threads BackgroundRefresh starts, so they can be told apart and waited for
+REFRESH_THREAD_NAME = 'incremental-refresh'
+
+# An IncrementalTable built and refreshed on a background thread, for pages that can paint from a narrower
+# query while the table loads. current(version) returns (frame, aggregates) once they are refreshed to the
+# given write counter; until then it starts a refresh if none is running and returns None. make_table builds
+# the IncrementalTable, and since building it is the full load it runs on the thread as well.
+class BackgroundRefresh:
+    def __init__(self, make_table):
+        self.make_table = make_table
+        self.table = None
+        self.lock = threading.Lock()
+        self.thread = None
+        self.version = None
+        self.result = None
+
+    def current(self, version):
+        with self.lock:
+            if self.result is not None and self.version == version:
+                return self.result
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, args=(version,), name=REFRESH_THREAD_NAME,
+                                               daemon=True)
+                self.thread.start()
+            return None
+
+    # The write counter is read by the caller before the refresh starts, so the result holds at least the
+    # rows of that version
+    def run(self, version):
+        try:
+            if self.table is None:
+                self.table = self.make_table()
+            result = self.table.refresh()
+        except Exception as exc:  # the next current() call starts another attempt
+            print(f"Background refresh failed: {exc}")
+            return
+        with self.lock:
+            self.version, self.result = version, result
+
+# Wait for the background refreshes in progress, e.g. before timing a page that reads their results
+def wait_for_refreshes(timeout=None):
+    for thread in threading.enumerate():
+        if thread.name == REFRESH_THREAD_NAME:
+            thread.join(timeout)
@@ -0,0 +1,194 @@
+# path/src/ingest.py
+
+import sys
+import json
+import time
+import argparse
+import datetime
+import numpy as np
+from sqlalchemy import insert, select
+from config.settings import DATABASE_URL, TIME_POINTS
+from create_db import (Client, Response, QuestionResponse, ClientFormResponse, FormQuestion, ProtocolForm, Answer,
+                       ensure_schema, is_compact, time_point_ids)
+from database import get_engine
+from populate_db import insert_columns
+from aggregations import SCORE_MAX
+
+# Write path for submitted forms. A submission is one form filled in by one client at one time point:
+#   {"client_id": 1, "protocol_id": 2, "form_id": 3, "time_point": "Baseline",
+#    "answers": [{"question_id": 7, "score": 2}, ...]}
+# Each answer becomes a Response (the score as text), a QuestionResponse link and a ClientFormResponse row, or
+# a single Answer row in the compact layout.
+
+SUBMISSION_KEYS = ('client_id', 'protocol_id', 'form_id', 'time_point', 'answers')
+ANSWER_KEYS = ('question_id', 'score')
+
+# JSON numbers without a fractional part; int() would silently truncate a score of 2.7 to 2
+def is_integral(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and float(value).is_integer()
+
+# Every key a submission and its answers need, with integral ids and scores, before anything is looked up
+def check_keys(submissions):
+    for position, submission in enumerate(submissions):
+        if not isinstance(submission, dict):
+            raise ValueError(f"Submission {position}: not a JSON object.")
+        missing = [key for key in SUBMISSION_KEYS if key not in submission]
+        if missing:
+            raise ValueError(f"Submission {position}: missing {', '.join(missing)}.")
+        if not isinstance(submission['answers'], list):
+            raise ValueError(f"Submission {position}: answers must be a list.")
+        values = [(key, submission[key]) for key in ('client_id', 'protocol_id', 'form_id')]
+        for answer in submission['answers']:
+            if not isinstance(answer, dict) or any(key not in answer for key in ANSWER_KEYS):
+                raise ValueError(f"Submission {position}: every answer needs a question_id and a score.")
+            values += [(key, answer[key]) for key in ANSWER_KEYS]
+        for key, value in values:
+            if not is_integral(value):
+                raise ValueError(f"Submission {position}: {key} {value!r} is not an integer.")
+
+# Check a batch against the catalog: complete submissions, known clients, a form that belongs to the protocol,
+# one of the canonical time points, questions that belong to the form, each answered once, and scores on the
+# answer scale. Raises ValueError naming the first bad submission.
+def validate(conn, submissions):
+    check_keys(submissions)
+    client_ids = {int(submission['client_id']) for submission in submissions}
+    known_clients = set(conn.execute(select(Client.id).where(Client.id.in_(client_ids))).scalars())
+    protocol_forms = set(conn.execute(select(ProtocolForm.protocol_id, ProtocolForm.form_id)).tuples())
+    form_questions = set(conn.execute(select(FormQuestion.form_id, FormQuestion.question_id)).tuples())
+
+    for position, submission in enumerate(submissions):
+        client_id, protocol_id, form_id = (int(submission[key]) for key in ('client_id', 'protocol_id', 'form_id'))
+        if client_id not in known_clients:
+            raise ValueError(f"Submission {position}: unknown client {client_id}.")
+        if (protocol_id, form_id) not in protocol_forms:
+            raise ValueError(f"Submission {position}: form {form_id} is not part of protocol {protocol_id}.")
+        if submission['time_point'] not in TIME_POINTS:
+            raise ValueError(f"Submission {position}: unknown time point {submission['time_point']!r} "
+                             f"(expected one of {', '.join(TIME_POINTS)}).")
+        if not submission.get('answers'):
+            raise ValueError(f"Submission {position}: no answers.")
+        answered = set()
+        for answer in submission['answers']:
+            question_id = int(answer['question_id'])
+            if question_id in answered:
+                raise ValueError(f"Submission {position}: question {question_id} is answered more than once.")
+            answered.add(question_id)
+            if (form_id, question_id) not in form_questions:
+                raise ValueError(f"Submission {position}: question {question_id} is not on form {form_id}.")
+            if not 0 <= int(answer['score']) <= SCORE_MAX:
+                raise ValueError(f"Submission {position}: score {answer['score']} is outside 0-{SCORE_MAX}.")
+
+# Write a batch of submissions in one transaction. The responses are inserted with multi-row INSERT ...
+# RETURNING statements, so the answer rows can reference their ids without a query per answer. The returned
+# rows are zipped back to the answers in order. SQLite does not promise RETURNING order (and asking SQLAlchemy
+# to sort by parameter order makes it fall back to one INSERT per row), so each returned text is checked
+# against its answer's score: responses with equal texts are interchangeable, and any other mismatch rolls
+# the batch back. Returns the number of answers written.
+def ingest(engine, submissions):
+    submissions = list(submissions)
+    if not submissions:
+        return 0
+    now = datetime.datetime.utcnow()
+    stamps = {'created_at': now, 'updated_at': now}
+    with engine.begin() as conn:
+        validate(conn, submissions)
+        answers = [(submission, answer) for submission in submissions for answer in submission['answers']]
+        if is_compact(conn):
+            time_point_id = time_point_ids(conn, [submission['time_point'] for submission in submissions])
+            insert_columns(conn, Answer, {
+                'client_id': [int(submission['client_id']) for submission, _ in answers],
+                'protocol_id': [int(submission['protocol_id']) for submission, _ in answers],
+                'form_id': [int(submission['form_id']) for submission, _ in answers],
+                'question_id': [int(answer['question_id']) for _, answer in answers],
+                'time_point_id': [time_point_id[submission['time_point']] for submission, _ in answers],
+                'score': [int(answer['score']) for _, answer in answers],
+            }, len(answers), answered_at=now)
+            return len(answers)
+        texts = [str(int(answer['score'])) for _, answer in answers]
+        returned = conn.execute(insert(Response).returning(Response.id, Response.text),
+                                [{'text': text, **stamps} for text in texts]).all()
+        if [text for _, text in returned] != texts:
+            raise RuntimeError("Response ids were not returned in insertion order; batch rolled back.")
+        response_ids = [response_id for response_id, _ in returned]
+        # The link and answer rows need nothing back, so they go through a driver-level executemany with the
+        # timestamps converted once rather than per row
+        question_ids = [int(answer['question_id']) for _, answer in answers]
+        insert_columns(conn, QuestionResponse, {'question': question_ids, 'response': response_ids},
+                       len(answers), **stamps)
+        insert_columns(conn, ClientFormResponse, {
+            'client_id': [int(submission['client_id']) for submission, _ in answers],
+            'form_id': [int(submission['form_id']) for submission, _ in answers],
+            'protocol_id': [int(submission['protocol_id']) for submission, _ in answers],
+            'question_id': question_ids,
+            'response_id': response_ids,
+            'time_point': [submission['time_point'] for submission, _ in answers],
+            'score': [int(answer['score']) for _, answer in answers],
+        }, len(answers), **stamps)
+    return len(answers)
+
+# Random valid submissions over the clients, protocols, forms and questions in the database, for load tests
+def synthetic_submissions(engine, count, seed=None, time_points=TIME_POINTS):
+    rng = np.random.default_rng(seed)
+    with engine.connect() as conn:
+        client_ids = conn.execute(select(Client.id)).scalars().all()
+        protocol_forms = conn.execute(select(ProtocolForm.protocol_id, ProtocolForm.form_id)).all()
+        questions = {}
+        for form_id, question_id in conn.execute(select(FormQuestion.form_id, FormQuestion.question_id)):
+            questions.setdefault(form_id, []).append(question_id)
+    for _ in range(count):
+        protocol_id, form_id = protocol_forms[rng.integers(len(protocol_forms))]
+        scores = rng.integers(0, SCORE_MAX + 1, len(questions[form_id]))
+        yield {
+            'client_id': int(client_ids[rng.integers(len(client_ids))]),
+            'protocol_id': protocol_id,
+            'form_id': form_id,
+            'time_point': time_points[rng.integers(len(time_points))],
+            'answers': [{'question_id': question_id, 'score': int(score)}
+                        for question_id, score in zip(questions[form_id], scores)],
+        }
+
+# Batches of non-blank lines; they are parsed per batch, so a malformed line only rejects its own batch
+def read_batches(lines, batch_size):
+    batch = []
+    for line in lines:
+        if line.strip():
+            batch.append(line)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest submitted forms from JSON lines, one submission per line.")
+    parser.add_argument("path", nargs="?", default="-", help="JSONL file to ingest, or - for standard input.")
+    parser.add_argument("--batch-size", type=int, default=100, help="Submissions written per transaction.")
+    parser.add_argument("--generate", type=int, default=None, metavar="N",
+                        help="Print N synthetic submissions as JSON lines instead of ingesting.")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for --generate.")
+    parser.add_argument("--database-url", default=DATABASE_URL, help="Database to write to.")
+    args = parser.parse_args()
+
+    engine = get_engine(args.database_url)
+    if args.generate is not None:
+        for submission in synthetic_submissions(engine, args.generate, args.seed):
+            print(json.dumps(submission))
+        sys.exit(0)
+
+    ensure_schema(engine)
+    lines = sys.stdin if args.path == "-" else open(args.path)
+    num_submissions = num_answers = num_rejected = 0
+    started = time.perf_counter()
+    with lines:
+        for number, batch in enumerate(read_batches(lines, args.batch_size), start=1):
+            try:
+                num_answers += ingest(engine, [json.loads(line) for line in batch])
+                num_submissions += len(batch)
+            except (ValueError, KeyError, TypeError) as error:
+                num_rejected += len(batch)
+                print(f"Batch {number} rejected: {error}", file=sys.stderr)
+    elapsed = time.perf_counter() - started
+    print(f"Ingested {num_submissions:,} submissions ({num_answers:,} answers) in {elapsed:.2f}s: "
+          f"{num_submissions / elapsed:,.0f} submissions/sec, {num_answers / elapsed:,.0f} answers/sec.")
+    if num_rejected:
+        print(f"{num_rejected:,} submissions rejected.")
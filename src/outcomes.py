@@ -0,0 +1,85 @@
+# path/src/outcomes.py
+
+import numpy as np
+import pandas as pd
+from aggregations import SCORE_MAX
+from fact_table import time_point_dtype
+from perf import timed
+
+# Outcome measures per client rather than pooled: every client's average score (percent of SCORE_MAX) per
+# entity and time point as a dense client x entity x time point array, NaN where the client has no answers,
+# and the change from the first time point (Baseline) to each later one, summarised across clients with
+# array reductions.
+
+class ScoreCube:
+    def __init__(self, values, by, client_ids, entity_ids, time_points):
+        self.values = values
+        self.by = by
+        self.client_ids = client_ids
+        self.entity_ids = entity_ids
+        self.time_points = time_points
+
+# Pivot in one pass, from answer rows (a score column, e.g. the fact table) or per-client sums (n and score_sum
+# columns, e.g. queries.client_timepoint_sums): each row's (client, entity, time point) cell is a flat index, and
+# the counts and score totals of all cells are two bincounts
+@timed('aggregate:score_cube')
+def score_cube(frame, by):
+    frame = frame[frame['time_point'].notna()]
+    if 'score_sum' in frame:
+        counts, totals = frame['n'].to_numpy(dtype=np.float64), frame['score_sum'].to_numpy(dtype=np.float64)
+    else:
+        frame = frame[frame['score'].notna()]
+        counts, totals = np.ones(len(frame)), frame['score'].to_numpy(dtype=np.float64)
+    client_codes, client_ids = pd.factorize(frame['client_id'], sort=True)
+    entity_codes, entity_ids = pd.factorize(frame[by], sort=True)
+    time_points = frame['time_point'].astype(time_point_dtype(frame['time_point']))
+    shape = (len(client_ids), len(entity_ids), len(time_points.cat.categories))
+    cells = (client_codes.astype(np.int64) * shape[1] + entity_codes) * shape[2] + time_points.cat.codes.to_numpy()
+    n = np.bincount(cells, weights=counts, minlength=np.prod(shape))
+    total = np.bincount(cells, weights=totals, minlength=np.prod(shape))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        values = (total / n * 100 / SCORE_MAX).reshape(shape)
+    return ScoreCube(values, by, np.asarray(client_ids), np.asarray(entity_ids), list(time_points.cat.categories))
+
+# Mean and sample standard deviation along the client axis over the cells where mask is set
+def masked_mean_std(values, mask):
+    n = mask.sum(axis=0)
+    masked = np.where(mask, values, 0.0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = masked.sum(axis=0) / n
+        variance = (np.square(masked).sum(axis=0) - n * np.square(mean)) / (n - 1)
+    return mean, np.sqrt(np.where(n > 1, np.clip(variance, 0, None), np.nan))
+
+def ratio(numerator, denominator):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(denominator > 0, numerator / denominator, np.nan)
+
+# Change from Baseline to each later time point per entity, over the clients scored at both: their number, the
+# mean and SD of the change (percentage points), the responders (improvement above `threshold` points) and their
+# share, Cohen's d (mean change over the SD of the same clients' Baseline scores) and the standardized response
+# mean (mean change over its SD)
+@timed('aggregate:change_summary')
+def change_summary(cube, threshold, lower_is_better=False):
+    baseline = cube.values[:, :, :1]
+    change = cube.values[:, :, 1:] - baseline
+    paired = ~np.isnan(change)
+    clients = paired.sum(axis=0)
+    mean_change, sd_change = masked_mean_std(change, paired)
+    _, sd_baseline = masked_mean_std(np.broadcast_to(baseline, change.shape), paired)
+    improvement = -change if lower_is_better else change
+    responders = (improvement > threshold).sum(axis=0)
+
+    entities, follow_ups = np.indices(clients.shape)
+    summary = pd.DataFrame({
+        cube.by: cube.entity_ids[entities.ravel()],
+        'time_point': np.asarray(cube.time_points[1:], dtype=object)[follow_ups.ravel()],
+        'clients': clients.ravel(),
+        'mean_change': mean_change.ravel(),
+        'sd_change': sd_change.ravel(),
+        'responders': responders.ravel(),
+        'responder_rate': ratio(responders, clients).ravel(),
+        'cohens_d': ratio(mean_change, sd_baseline).ravel(),
+        'srm': ratio(mean_change, sd_change).ravel(),
+    })
+    summary['time_point'] = pd.Categorical(summary['time_point'], categories=cube.time_points, ordered=True)
+    return summary[summary['clients'] > 0].reset_index(drop=True)
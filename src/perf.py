@@ -0,0 +1,173 @@
+# path/src/perf.py
+
+import json
+import threading
+import time
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from sqlalchemy import event
+from config.settings import PERF_LOG_PATH
+
+# Process-wide timings and counters of the dashboard's hot paths: the data loads, aggregations, figure builds,
+# chart rendering and SQL statements. Every Streamlit session of a server process records into the same
+# registry. Recording is a perf_counter call and a dict update under a lock, cheap enough to leave on.
+
+class Section:
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.last_seconds = 0.0
+
+    def add(self, seconds):
+        self.calls += 1
+        self.seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.last_seconds = seconds
+
+lock = threading.Lock()
+sections = {}
+counters = {}
+log_lock = threading.Lock()
+
+def record(name, seconds):
+    with lock:
+        section = sections.get(name)
+        if section is None:
+            section = sections[name] = Section()
+        section.add(seconds)
+    if PERF_LOG_PATH:
+        write_log({'type': 'timing', 'name': name, 'seconds': round(seconds, 6)})
+
+def count(name, amount=1):
+    with lock:
+        counters[name] = counters.get(name, 0) + amount
+
+def reset():
+    with lock:
+        sections.clear()
+        counters.clear()
+
+# Times a block under a name; sections are recorded when the block raises as well
+class Timer:
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, time.perf_counter() - self.started)
+        return False
+
+    # As a decorator, every call gets a Timer of its own: concurrent calls (sessions, loader threads) sharing
+    # one would overwrite each other's start time
+    def __call__(self, func):
+        @wraps(func)
+        def timed_call(*args, **kwargs):
+            with Timer(self.name):
+                return func(*args, **kwargs)
+        return timed_call
+
+# e.g. `with timed('load_data'):` or `@timed('figure:histogram')`
+def timed(name):
+    return Timer(name)
+
+# One JSON object per line, appended to PERF_LOG_PATH for log shippers
+def write_log(entry):
+    line = json.dumps({'ts': round(time.time(), 3), **entry})
+    with log_lock:
+        with open(PERF_LOG_PATH, 'a') as log_file:
+            log_file.write(line + "\n")
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('perf_query_started', []).append(time.perf_counter())
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    seconds = time.perf_counter() - conn.info['perf_query_started'].pop()
+    record(f"sql:{statement.lstrip().split(None, 1)[0].upper()}", seconds)
+
+def handle_error(context):
+    started = context.connection.info.get('perf_query_started') if context.connection is not None else None
+    if started:
+        started.pop()
+
+# Time every SQL statement of an engine, grouped by its leading keyword (sql:SELECT, sql:INSERT, ...). This
+# covers executing the statement; fetching its rows counts towards the enclosing section (e.g. read_table).
+# Start times are kept per connection, so concurrent loader threads do not mix them up.
+def instrument_engine(engine):
+    if not event.contains(engine, "before_cursor_execute", before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", after_cursor_execute)
+        event.listen(engine, "handle_error", handle_error)
+    return engine
+
+# Current numbers as plain dicts, slowest total first
+def snapshot():
+    with lock:
+        timings = [{'section': name, 'calls': section.calls, 'total_s': section.seconds,
+                    'mean_s': section.seconds / section.calls, 'max_s': section.max_seconds,
+                    'last_s': section.last_seconds}
+                   for name, section in sections.items()]
+        counts = dict(counters)
+    return sorted(timings, key=lambda timing: timing['total_s'], reverse=True), counts
+
+def to_json():
+    timings, counts = snapshot()
+    return json.dumps({'ts': round(time.time(), 3), 'sections': timings, 'counters': counts}, indent=2)
+
+def label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+# Prometheus text exposition format: a summary (sum and count) and a max gauge per section, and one counter
+# per event
+def to_prometheus():
+    timings, counts = snapshot()
+    lines = [
+        "# HELP dashboard_section_seconds Time spent in instrumented dashboard sections.",
+        "# TYPE dashboard_section_seconds summary",
+    ]
+    for timing in timings:
+        section = label(timing['section'])
+        lines.append(f'dashboard_section_seconds_sum{{section="{section}"}} {timing["total_s"]:.6f}')
+        lines.append(f'dashboard_section_seconds_count{{section="{section}"}} {timing["calls"]}')
+    lines += [
+        "# HELP dashboard_section_seconds_max Longest single call of each section.",
+        "# TYPE dashboard_section_seconds_max gauge",
+    ]
+    for timing in timings:
+        lines.append(f'dashboard_section_seconds_max{{section="{label(timing["section"])}"}} {timing["max_s"]:.6f}')
+    lines += [
+        "# HELP dashboard_events_total Counted dashboard events.",
+        "# TYPE dashboard_events_total counter",
+    ]
+    for name, value in sorted(counts.items()):
+        lines.append(f'dashboard_events_total{{name="{label(name)}"}} {value}')
+    return "\n".join(lines) + "\n"
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == '/metrics':
+            body, content_type = to_prometheus(), "text/plain; version=0.0.4"
+        elif self.path == '/metrics.json':
+            body, content_type = to_json(), "application/json"
+        else:
+            self.send_error(404)
+            return
+        data = body.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+# Serve /metrics (Prometheus) and /metrics.json from a daemon thread of this process
+def serve_metrics(port, host="0.0.0.0"):
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Serving performance metrics on http://{host}:{server.server_port}/metrics")
+    return server
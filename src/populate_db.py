@@ -1,34 +1,27 @@
 # path/src/populate_db.py
 
-import random
+import argparse
 import datetime
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from config.settings import DATABASE_URL
-from create_db import Base, Protocol, Client, Form, Question, FormQuestion, Response, QuestionResponse, ClientFormResponse, ProtocolForm
+import time
+from itertools import repeat
+import numpy as np
+from sqlalchemy import insert, select, func
+from config.settings import DATABASE_URL, TIME_POINTS
+from database import get_engine
+from create_db import ensure_schema, ensure_triggers, drop_triggers, rebuild_summaries, bump_versions, is_compact, time_point_ids, Answer, Protocol, Client, Form, Question, FormQuestion, Response, QuestionResponse, ClientFormResponse, ProtocolForm
 
-# Create an engine and session
-engine = create_engine(DATABASE_URL)
-Session = sessionmaker(bind=engine)
-session = Session()
+BASE_PROTOCOL = "Basic Protocol Template for Group Ceremony"
 
-# Create Protocols
+# Protocols
 protocols = [
-    ("Basic Protocol Template for Group Ceremony", "Protocol for group ceremonies including various psychological scales."),
+    (BASE_PROTOCOL, "Protocol for group ceremonies including various psychological scales."),
     ("PTSD Protocol", "Protocol for assessing PTSD symptoms."),
     ("Depression Protocol", "Protocol for assessing depression symptoms."),
     ("Social Anxiety Protocol", "Protocol for assessing social anxiety symptoms."),
     ("Generalized Anxiety Protocol", "Protocol for assessing generalized anxiety symptoms.")
 ]
 
-protocol_objects = {}
-for name, description in protocols:
-    protocol = Protocol(name=name, description=description)
-    session.add(protocol)
-    session.commit()
-    protocol_objects[name] = protocol
-
-# Create Forms
+# Forms
 forms = [
     ("Mindfulness Attention Awareness Scale (MAAS)", "MAAS Description", "MAAS"),
     ("Psychedelic Predictor Scale", "PPS Description", "PPS"),
@@ -40,14 +33,7 @@ forms = [
     ("Generalized Anxiety Form", "Generalized Anxiety Form Description", "Generalized Anxiety")
 ]
 
-form_objects = {}
-for name, description, ftype in forms:
-    form = Form(name=name, description=description, type="Likert scale")
-    session.add(form)
-    session.commit()
-    form_objects[ftype] = form
-
-# Create Questions
+# Questions
 questions_data = {
     "MAAS": [
         "I could be experiencing some emotion and not be conscious of it until some time later.",
@@ -167,20 +153,7 @@ questions_data = {
     ]
 }
 
-question_objects = {}
-for ftype, questions in questions_data.items():
-    for question_text in questions:
-        question = Question(text=question_text, description=f"{ftype} Question")
-        session.add(question)
-        session.commit()
-        form_question = FormQuestion(form_id=form_objects[ftype].id, question_id=question.id)
-        session.add(form_question)
-        session.commit()
-        if ftype not in question_objects:
-            question_objects[ftype] = []
-        question_objects[ftype].append(question)
-
-# Assign forms to protocols
+# Forms assigned to each protocol
 form_protocol_mapping = {
     "Basic Protocol Template for Group Ceremony": ["MAAS", "PPS", "SCS", "MEQ-30"],
     "PTSD Protocol": ["PTSD"],
@@ -189,61 +162,210 @@ form_protocol_mapping = {
     "Generalized Anxiety Protocol": ["Generalized Anxiety"]
 }
 
-for protocol_name, form_types in form_protocol_mapping.items():
-    protocol_id = protocol_objects[protocol_name].id
-    for form_type in form_types:
-        protocol_form = ProtocolForm(protocol_id=protocol_id, form_id=form_objects[form_type].id)
-        session.add(protocol_form)
-        session.commit()
-
-# Create Clients and Responses
-num_clients = 100
-time_intervals = ["Baseline", "1-Month", "3-Months", "6-Months", "1-Year"]
-
-for i in range(num_clients):
-    client = Client(name=f"Client {i+1}", email=f"client{i+1}@example.com")
-    session.add(client)
-    session.commit()
-
-    # Ensure each client fills out the "Basic Protocol Template for Group Ceremony"
-    selected_protocols = ["Basic Protocol Template for Group Ceremony"]
-
-    # Randomly select 0-2 other protocols for the client to fill out
-    other_protocols = random.sample(list(protocol_objects.keys())[1:], random.randint(0, 2))
-    selected_protocols.extend(other_protocols)
-
-    for interval in time_intervals:
-        for protocol_name in selected_protocols:
-            protocol = protocol_objects[protocol_name]
-            form_types = form_protocol_mapping[protocol_name]
-            for form_type in form_types:
-                for question in question_objects[form_type]:
-                    if interval == "Baseline":
-                        score = random.randint(0, 4)  # Baseline scores in the range 0-4
-                    else:
-                        baseline_scores = [random.randint(0, 4) for _ in range(5)]  # Generate baseline scores
-                        baseline_avg = sum(baseline_scores) / len(baseline_scores)
-                        reduction_factor = random.uniform(0.05, 0.8)  # 5-80% reduction
-                        score = max(0, int(baseline_avg * reduction_factor))
-                    
-                    response = Response(text=str(score))
-                    session.add(response)
-                    session.commit()
-
-                    question_response = QuestionResponse(question=question.id, response=response.id)
-                    session.add(question_response)
-                    session.commit()
-
-                    client_form_response = ClientFormResponse(
-                        client_id=client.id,
-                        form_id=form_objects[form_type].id,
-                        protocol_id=protocol.id,
-                        question_id=question.id,
-                        response_id=response.id,
-                        time_point=interval
-                    )
-                    session.add(client_form_response)
-                    session.commit()
-
-print("Database populated with synthetic data based on specified patterns.")
+SCORE_TEXT = np.array([str(score) for score in range(5)], dtype=object)
+
+
+# Next free primary key, so that columnar batches can carry their own ids
+def next_id(conn, model):
+    return (conn.execute(select(func.max(model.__table__.c.id))).scalar() or 0) + 1
+
+# Insert columnar data (column name -> array) with a driver-level executemany in slices of batch_size rows.
+# `constants` are converted to their database representation once instead of once per row.
+def insert_columns(conn, model, columns, batch_size, **constants):
+    table = model.__table__
+    names = list(columns)
+    statement = str(insert(table).compile(dialect=conn.dialect, column_keys=names + list(constants)))
+    fixed = []
+    for name, value in constants.items():
+        process = table.c[name].type.dialect_impl(conn.dialect).bind_processor(conn.dialect)
+        fixed.append(repeat(process(value) if process else value))
+    num_rows = len(columns[names[0]])
+    for start in range(0, num_rows, batch_size):
+        chunk = [np.asarray(columns[name][start:start + batch_size]).tolist() for name in names]
+        conn.exec_driver_sql(statement, list(zip(*chunk, *fixed)))
+    return num_rows
+
+# Create protocols, forms, questions and their link tables.
+# Returns one (form_ids, question_ids) template per protocol, in `protocols` order.
+def create_catalog(conn, now, batch_size):
+    stamps = dict(created_at=now, updated_at=now)
+
+    protocol_start = next_id(conn, Protocol)
+    protocol_ids = {name: protocol_start + i for i, (name, _) in enumerate(protocols)}
+    insert_columns(conn, Protocol, {
+        'id': list(protocol_ids.values()),
+        'name': [name for name, _ in protocols],
+        'description': [description for _, description in protocols],
+    }, batch_size, **stamps)
+
+    form_start = next_id(conn, Form)
+    form_ids = {ftype: form_start + i for i, (_, _, ftype) in enumerate(forms)}
+    insert_columns(conn, Form, {
+        'id': list(form_ids.values()),
+        'name': [name for name, _, _ in forms],
+        'description': [description for _, description, _ in forms],
+    }, batch_size, type="Likert scale", **stamps)
+
+    question_start = next_id(conn, Question)
+    question_rows = [(ftype, text) for ftype, questions in questions_data.items() for text in questions]
+    question_ids = np.arange(question_start, question_start + len(question_rows))
+    question_forms = np.array([form_ids[ftype] for ftype, _ in question_rows])
+    insert_columns(conn, Question, {
+        'id': question_ids,
+        'text': [text for _, text in question_rows],
+        'description': [f"{ftype} Question" for ftype, _ in question_rows],
+    }, batch_size, **stamps)
+    insert_columns(conn, FormQuestion, {'form_id': question_forms, 'question_id': question_ids}, batch_size, **stamps)
+
+    protocol_form_rows = [(protocol_ids[name], form_ids[ftype])
+                          for name, form_types in form_protocol_mapping.items() for ftype in form_types]
+    insert_columns(conn, ProtocolForm, {
+        'protocol_id': [protocol_id for protocol_id, _ in protocol_form_rows],
+        'form_id': [form_id for _, form_id in protocol_form_rows],
+    }, batch_size, **stamps)
+
+    templates = []
+    for name, _ in protocols:
+        protocol_forms = [form_ids[ftype] for ftype in form_protocol_mapping[name]]
+        mask = np.isin(question_forms, protocol_forms)
+        templates.append((protocol_ids[name], question_forms[mask], question_ids[mask]))
+    return templates
+
+# Pick the protocols each client fills out: BASE_PROTOCOL plus `extra_range` other protocols, sampled without
+# replacement according to `weights` (one per other protocol, in `protocols` order; Gumbel top-k, vectorized over
+# clients). Returns one column per protocol of `protocols`.
+def sample_memberships(rng, num_clients, extra_range, weights):
+    keys = np.log(weights) + rng.gumbel(size=(num_clients, len(weights)))
+    ranks = np.argsort(np.argsort(-keys, axis=1), axis=1)
+    num_extra = rng.integers(extra_range[0], extra_range[1] + 1, size=num_clients)
+    base = [name for name, _ in protocols].index(BASE_PROTOCOL)
+    return np.insert(ranks < num_extra[:, None], base, True, axis=1)
+
+# Baseline scores are uniform 0-4; follow-ups are a baseline average reduced by 5-80%
+def generate_scores(rng, is_baseline):
+    scores = rng.integers(0, 5, size=len(is_baseline), dtype=np.int8)
+    follow_up = ~is_baseline
+    num_follow_up = int(follow_up.sum())
+    baseline_avg = rng.integers(0, 5, size=(num_follow_up, 5)).mean(axis=1)
+    reduction_factor = rng.uniform(0.05, 0.8, size=num_follow_up)
+    scores[follow_up] = (baseline_avg * reduction_factor).astype(np.int8)
+    return scores
+
+# Build the answer rows for a chunk of clients as columnar arrays, ordered by client, time point and protocol
+def build_answers(client_ids, membership, templates, num_time_points):
+    parts = []
+    for p, (protocol_id, form_ids, question_ids) in enumerate(templates):
+        members = client_ids[membership[:, p]]
+        per_client = num_time_points * len(question_ids)
+        parts.append((
+            np.repeat(members, per_client),
+            np.tile(np.repeat(np.arange(num_time_points), len(question_ids)), len(members)),
+            np.full(len(members) * per_client, protocol_id),
+            np.tile(form_ids, len(members) * num_time_points),
+            np.tile(question_ids, len(members) * num_time_points),
+        ))
+    client, time_index, protocol, form, question = (np.concatenate(column) for column in zip(*parts))
+    order = np.lexsort((time_index, client))
+    return client[order], time_index[order], protocol[order], form[order], question[order]
+
+def populate(engine, num_clients=100, seed=None, time_points=TIME_POINTS, extra_range=(0, 2),
+             protocol_weights=None, client_chunk=1000, batch_size=50000):
+    rng = np.random.default_rng(seed)
+    now = datetime.datetime.utcnow()
+    stamps = dict(created_at=now, updated_at=now)
+    weights = np.asarray(protocol_weights or [1.0] * (len(protocols) - 1), dtype=float)
+    time_labels = np.array(time_points, dtype=object)
+    is_baseline_point = np.array([tp == "Baseline" for tp in time_points])
+    compact = is_compact(engine)
+    answer_tables = ['answer'] if compact else ['response', 'question_response', 'client_form_response']
+    counts = dict.fromkeys(['client'] + answer_tables, 0)
+
+    with engine.begin() as conn:
+        templates = create_catalog(conn, now, batch_size)
+        if compact:
+            time_point_id = time_point_ids(conn, time_points)
+            time_point_codes = np.array([time_point_id[time_point] for time_point in time_points])
+
+    for chunk_start in range(0, num_clients, client_chunk):
+        chunk_size = min(client_chunk, num_clients - chunk_start)
+        with engine.begin() as conn:
+            first_client = next_id(conn, Client)
+            client_ids = np.arange(first_client, first_client + chunk_size)
+            numbers = np.arange(chunk_start + 1, chunk_start + chunk_size + 1)
+            counts['client'] += insert_columns(conn, Client, {
+                'id': client_ids,
+                'name': [f"Client {i}" for i in numbers],
+                'email': [f"client{i}@example.com" for i in numbers],
+            }, batch_size, **stamps)
+
+            membership = sample_memberships(rng, chunk_size, extra_range, weights)
+            client, time_index, protocol, form, question = build_answers(client_ids, membership, templates, len(time_points))
+            scores = generate_scores(rng, is_baseline_point[time_index])
+
+            if compact:
+                counts['answer'] += insert_columns(conn, Answer, {
+                    'client_id': client, 'protocol_id': protocol, 'form_id': form, 'question_id': question,
+                    'time_point_id': time_point_codes[time_index], 'score': scores,
+                }, batch_size, answered_at=now)
+                continue
+
+            num_answers = len(client)
+            response_ids = next_id(conn, Response) + np.arange(num_answers)
+            question_response_ids = next_id(conn, QuestionResponse) + np.arange(num_answers)
+            answer_ids = next_id(conn, ClientFormResponse) + np.arange(num_answers)
+
+            counts['response'] += insert_columns(conn, Response, {
+                'id': response_ids, 'text': SCORE_TEXT[scores],
+            }, batch_size, **stamps)
+            counts['question_response'] += insert_columns(conn, QuestionResponse, {
+                'id': question_response_ids, 'question': question, 'response': response_ids,
+            }, batch_size, **stamps)
+            counts['client_form_response'] += insert_columns(conn, ClientFormResponse, {
+                'id': answer_ids, 'client_id': client, 'form_id': form, 'protocol_id': protocol,
+                'question_id': question, 'response_id': response_ids, 'time_point': time_labels[time_index],
+                'score': scores,
+            }, batch_size, **stamps)
+    return counts
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Populate the database with synthetic clients and responses.")
+    parser.add_argument("--clients", type=int, default=100, help="Number of clients to generate.")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for reproducible fixtures.")
+    parser.add_argument("--time-points", nargs="+", default=TIME_POINTS, help="Time points every client answers at.")
+    parser.add_argument("--extra-protocols", nargs=2, type=int, default=(0, 2), metavar=("MIN", "MAX"),
+                        help="Range of additional protocols assigned to each client besides the base protocol.")
+    parser.add_argument("--protocol-weights", nargs=len(protocols) - 1, type=float, default=None,
+                        metavar="WEIGHT", help="Relative sampling weights of the additional protocols.")
+    parser.add_argument("--client-chunk", type=int, default=1000, help="Clients generated per transaction.")
+    parser.add_argument("--batch-size", type=int, default=50000, help="Rows per executemany call.")
+    parser.add_argument("--database-url", default=DATABASE_URL, help="Database to populate.")
+    parser.add_argument("--compact", action="store_true",
+                        help="Create a new database with the compact answer layout (see create_db.py --compact).")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    engine = get_engine(args.database_url)
+    ensure_schema(engine, compact=args.compact)
+
+    # Summary tables and data versions are updated once at the end instead of per row by the triggers
+    started = time.perf_counter()
+    drop_triggers(engine)
+    try:
+        counts = populate(engine, num_clients=args.clients, seed=args.seed, time_points=args.time_points,
+                          extra_range=args.extra_protocols, protocol_weights=args.protocol_weights,
+                          client_chunk=args.client_chunk, batch_size=args.batch_size)
+    finally:
+        rebuild_summaries(engine)
+        bump_versions(engine)
+        ensure_triggers(engine)
+    elapsed = time.perf_counter() - started
+
+    total_rows = sum(counts.values())
+    for table_name, num_rows in counts.items():
+        print(f"{table_name:>22}: {num_rows:>10,} rows")
+    print(f"Inserted {total_rows:,} rows in {elapsed:.2f}s ({total_rows / elapsed:,.0f} rows/sec).")
+    print("Database populated with synthetic data based on specified patterns.")
 
+if __name__ == "__main__":
+    main()
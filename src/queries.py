@@ -0,0 +1,107 @@
+# path/src/queries.py
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select, func
+from create_db import (Client, Form, Protocol, ClientFormResponse, FormTimepointStats, ProtocolTimepointStats,
+                       QuestionTimepointStats, ClientTimepointStats, ClientProtocol, DataVersion, Answer,
+                       version_aliases, is_compact)
+
+client_form_response = ClientFormResponse.__table__
+
+# Trigger-maintained summary tables, keyed by the column they aggregate over
+summary_tables = {
+    'form_id': FormTimepointStats.__table__,
+    'protocol_id': ProtocolTimepointStats.__table__,
+    'question_id': QuestionTimepointStats.__table__,
+}
+
+# n, sum and sum of squares of the scores per (entity, time point), aggregated inside the database.
+# Same columns as aggregations.timepoint_sums; the filters restrict rows to some clients, forms, protocols or
+# questions. Unfiltered form/protocol/question aggregates (or ones filtered on the grouping column) come from
+# the summary tables.
+def timepoint_sums(engine, by, client_ids=None, form_ids=None, protocol_ids=None, question_ids=None):
+    filters = {'client_id': client_ids, 'form_id': form_ids, 'protocol_id': protocol_ids, 'question_id': question_ids}
+    filters = {column: [int(value) for value in values] for column, values in filters.items() if values is not None}
+
+    if by in summary_tables and set(filters) <= {by}:
+        summary = summary_tables[by]
+        query = (
+            select(summary.c[by], summary.c.time_point, summary.c.n, summary.c.score_sum, summary.c.score_sq_sum)
+            .where(summary.c.n > 0)
+        )
+        source = summary
+    else:
+        group = client_form_response.c[by]
+        score = client_form_response.c.score
+        query = (
+            select(group, client_form_response.c.time_point,
+                   func.count(score).label('n'),
+                   func.sum(score).label('score_sum'),
+                   func.sum(score * score).label('score_sq_sum'))
+            .where(score.is_not(None))
+            .group_by(group, client_form_response.c.time_point)
+        )
+        source = client_form_response
+    for column, values in filters.items():
+        query = query.where(source.c[column].in_(values))
+    with engine.connect() as conn:
+        return pd.read_sql(query, conn)
+
+# Scores of every answered question of one form. Scores take a handful of values, so they are counted per
+# value on the (form_id, time_point, score) index and expanded in memory rather than transferred row by row.
+def form_scores(engine, form_id):
+    score = client_form_response.c.score
+    query = (
+        select(score, func.count().label('n'))
+        .where(client_form_response.c.form_id == int(form_id), score.is_not(None))
+        .group_by(score)
+    )
+    with engine.connect() as conn:
+        counts = pd.read_sql(query, conn)
+    return pd.Series(np.repeat(counts['score'].to_numpy(), counts['n'].to_numpy()), name='score')
+
+# (client_id, protocol_id) of every protocol each client has answers to, from the membership table
+def client_protocols(engine):
+    query = select(ClientProtocol.client_id, ClientProtocol.protocol_id).where(ClientProtocol.n > 0)
+    with engine.connect() as conn:
+        return pd.read_sql(query, conn)
+
+# n, sum and sum of squares of the scores per (client, form or protocol, time point), from the client summary
+# table; an answer counts towards the protocol it was given under, as in timepoint_sums. entity_ids restricts
+# the forms or protocols.
+def client_timepoint_sums(engine, by='form_id', entity_ids=None):
+    stats = ClientTimepointStats.__table__
+    entity = stats.c[by]
+    query = (
+        select(stats.c.client_id, entity, stats.c.time_point, func.sum(stats.c.n).label('n'),
+               func.sum(stats.c.score_sum).label('score_sum'), func.sum(stats.c.score_sq_sum).label('score_sq_sum'))
+        .where(stats.c.n > 0)
+        .group_by(stats.c.client_id, entity, stats.c.time_point)
+    )
+    if entity_ids is not None:
+        query = query.where(entity.in_([int(entity_id) for entity_id in entity_ids]))
+    with engine.connect() as conn:
+        return pd.read_sql(query, conn)
+
+# Row counts shown in the Overview summary table. In the compact layout answers are counted on their table;
+# through the view the count would join every row to its time point.
+def summary_counts(engine):
+    answers = Answer if is_compact(engine) else ClientFormResponse
+    query = select(
+        select(func.count()).select_from(Client).scalar_subquery().label('clients'),
+        select(func.count()).select_from(answers).scalar_subquery().label('answers'),
+        select(func.count()).select_from(Form).scalar_subquery().label('forms'),
+        select(func.count()).select_from(Protocol).scalar_subquery().label('protocols'),
+    )
+    with engine.connect() as conn:
+        return dict(conn.execute(query).mappings().one())
+
+# Write counters of the versioned tables; a cheap primary-key read suitable for every rerun. In the compact
+# layout response and question_response are views over the answers and share their counter.
+def table_versions(engine):
+    with engine.connect() as conn:
+        versions = dict(conn.execute(select(DataVersion.table_name, DataVersion.version)).all())
+    for view_name, table_name in version_aliases.items():
+        versions.setdefault(view_name, versions.get(table_name, 0))
+    return versions
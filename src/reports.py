@@ -0,0 +1,264 @@
+# path/src/reports.py
+
+import os
+import io
+import glob
+import argparse
+import hashlib
+import threading
+import time
+import zipfile
+from concurrent.futures import Future, as_completed
+import pandas as pd
+from sqlalchemy import select
+from config.settings import DATABASE_URL, REPORT_CACHE_DIR, REPORT_WORKERS, RESPONDER_THRESHOLD, LOWER_SCORES_IMPROVE
+from create_db import Client, Form, Protocol, ClientFormResponse, ensure_schema
+from database import get_engine
+from aggregations import stats_from_sums, chart_frame
+from figures import timepoint_line_chart, score_histogram
+import queries
+import outcomes
+from workers import spawn_pool
+
+try:
+    from fpdf import FPDF
+    import kaleido  # noqa: F401  static image backend of plotly's to_image
+except ImportError:  # fpdf2 and kaleido are optional; without them PDF reports are unavailable
+    FPDF = None
+
+PDF_AVAILABLE = FPDF is not None
+
+# Size of the chart images embedded in the reports, in pixels
+FIGURE_WIDTH = 1000
+FIGURE_HEIGHT = 500
+
+# Data version the cached reports are keyed on: the write counters of all versioned tables
+def data_version(engine):
+    return ",".join(f"{table}={version}" for table, version in sorted(queries.table_versions(engine).items()))
+
+def short_hash(key):
+    return hashlib.sha1(key.encode()).hexdigest()[:12]
+
+# Cache file of a report, named <report type>_<report key>_<version key>.pdf: the report key covers the type and
+# the entities, the version key the data and the responder settings, so a change to any of them gives a new file
+# and the files of one report share their prefix
+def report_path(report_type, entity_ids, version, cache_dir=REPORT_CACHE_DIR):
+    report_key = short_hash(f"{report_type}:{','.join(str(int(entity_id)) for entity_id in sorted(entity_ids))}")
+    version_key = short_hash(f"{version}:{RESPONDER_THRESHOLD:g}:{int(LOWER_SCORES_IMPROVE)}")
+    return os.path.join(cache_dir, f"{report_type}_{report_key}_{version_key}.pdf")
+
+# Remove the files of the same report rendered for earlier data versions; they can never be served again
+def evict_older_versions(path):
+    prefix = path.rsplit('_', 1)[0]
+    for old_path in glob.glob(f"{glob.escape(prefix)}_*.pdf"):
+        if old_path != path:
+            try:
+                os.remove(old_path)
+            except FileNotFoundError:  # evicted by another worker meanwhile
+                pass
+
+def entity_names(engine, model):
+    with engine.connect() as conn:
+        return pd.read_sql(select(model.id, model.name), conn)
+
+def new_pdf(title):
+    pdf = FPDF()
+    pdf.set_auto_page_break(auto=True, margin=15)
+    pdf.add_page()
+    pdf.set_font("Helvetica", "B", 18)
+    pdf.cell(0, 12, title, new_x="LMARGIN", new_y="NEXT")
+    pdf.set_font("Helvetica", size=11)
+    return pdf
+
+def add_heading(pdf, text):
+    pdf.ln(4)
+    pdf.set_font("Helvetica", "B", 14)
+    pdf.cell(0, 9, text, new_x="LMARGIN", new_y="NEXT")
+    pdf.set_font("Helvetica", size=11)
+
+def add_text(pdf, text):
+    pdf.cell(0, 7, text, new_x="LMARGIN", new_y="NEXT")
+
+# Plotly figure rendered to a static PNG by kaleido and scaled to the page width
+def add_figure(pdf, fig):
+    png = fig.to_image(format="png", width=FIGURE_WIDTH, height=FIGURE_HEIGHT)
+    pdf.image(io.BytesIO(png), w=pdf.epw)
+
+# Average score (%) and response count per entity and time point, as a table
+def add_scores_table(pdf, scores):
+    pdf.set_font("Helvetica", size=9)
+    with pdf.table(text_align="LEFT") as table:
+        table.row(["Name", "Time Point", "N", "Average Score (%)", "Std Dev (%)"])
+        for row in scores.itertuples(index=False):
+            std_dev = "" if pd.isna(row.std_dev) else f"{row.std_dev:.1f}"
+            table.row([row.name, str(row.time_point), str(row.count), f"{row.average_score:.1f}", std_dev])
+    pdf.set_font("Helvetica", size=11)
+
+# Change from Baseline per entity and follow-up time point (outcomes.change_summary), as a table
+def add_change_table(pdf, changes):
+    pdf.set_font("Helvetica", size=9)
+    with pdf.table(text_align="LEFT") as table:
+        table.row(["Name", "Follow-Up", "Clients", "Mean Change (points)", "Responders (%)", "Cohen's d", "SRM"])
+        for row in changes.itertuples(index=False):
+            table.row([row.name, str(row.time_point), str(row.clients), f"{row.mean_change:+.1f}",
+                       f"{row.responder_rate * 100:.1f}",
+                       *("" if pd.isna(value) else f"{value:+.2f}" for value in (row.cohens_d, row.srm))])
+    pdf.set_font("Helvetica", size=11)
+
+def scores_by(engine, by, entities, **filters):
+    return chart_frame(stats_from_sums(queries.timepoint_sums(engine, by, **filters)), by, entities)
+
+# Client Report: the client's protocol and form progress charts, score distribution and statistics
+def build_client_report(engine, client_ids):
+    client_id = int(client_ids[0])
+    with engine.connect() as conn:
+        client = conn.execute(select(Client.name, Client.email).where(Client.id == client_id)).one()
+        scores = pd.read_sql(
+            select(ClientFormResponse.score)
+            .where(ClientFormResponse.client_id == client_id, ClientFormResponse.score.is_not(None)),
+            conn)['score']
+    form_scores = scores_by(engine, 'form_id', entity_names(engine, Form), client_ids=[client_id])
+    protocol_scores = scores_by(engine, 'protocol_id', entity_names(engine, Protocol), client_ids=[client_id])
+
+    pdf = new_pdf(f"Client Report: {client.name}")
+    add_text(pdf, f"Email: {client.email}")
+    add_text(pdf, f"Generated: {time.strftime('%Y-%m-%d %H:%M')}")
+
+    add_heading(pdf, "Protocols Over Time")
+    add_figure(pdf, timepoint_line_chart(protocol_scores, 'Protocol'))
+    add_heading(pdf, "Forms Over Time")
+    add_figure(pdf, timepoint_line_chart(form_scores, 'Form'))
+    add_scores_table(pdf, form_scores)
+
+    add_heading(pdf, "Response Statistics")
+    if scores.empty:
+        add_text(pdf, "No answers recorded.")
+    else:
+        add_text(pdf, f"Answers: {len(scores):,}")
+        add_text(pdf, f"Mean: {scores.mean():.2f}")
+        add_text(pdf, f"Median: {scores.median():.2f}")
+        add_text(pdf, f"Mode: {scores.mode().values[0]:.2f}")
+        add_figure(pdf, score_histogram(scores))
+    return bytes(pdf.output())
+
+# Protocol Efficacy report: average score per time point of the selected protocols
+def build_protocol_report(engine, protocol_ids):
+    protocols = entity_names(engine, Protocol)
+    protocol_scores = scores_by(engine, 'protocol_id', protocols, protocol_ids=list(protocol_ids))
+    cube = outcomes.score_cube(queries.client_timepoint_sums(engine, 'protocol_id', entity_ids=list(protocol_ids)),
+                               'protocol_id')
+    changes = outcomes.change_summary(cube, RESPONDER_THRESHOLD, LOWER_SCORES_IMPROVE)
+    changes = changes.merge(protocols, left_on='protocol_id', right_on='id')
+
+    pdf = new_pdf("Protocol Efficacy Report")
+    add_text(pdf, f"Generated: {time.strftime('%Y-%m-%d %H:%M')}")
+    add_text(pdf, "Protocols: " + ", ".join(protocols[protocols['id'].isin(protocol_ids)]['name']))
+    add_heading(pdf, "Average Score per Time Point")
+    add_figure(pdf, timepoint_line_chart(protocol_scores, 'Protocol'))
+    add_scores_table(pdf, protocol_scores)
+
+    add_heading(pdf, "Change From Baseline")
+    direction = "fell" if LOWER_SCORES_IMPROVE else "rose"
+    add_text(pdf, f"Responders: clients whose score {direction} by more than {RESPONDER_THRESHOLD:g} points from "
+                  "Baseline.")
+    if changes.empty:
+        add_text(pdf, "No clients with answers at Baseline and a later time point.")
+    else:
+        add_change_table(pdf, changes)
+    return bytes(pdf.output())
+
+REPORT_BUILDERS = {
+    'client': build_client_report,
+    'protocol_efficacy': build_protocol_report,
+}
+
+# Worker entry point: render one report into its cache file. Runs in a spawned process with its own engine;
+# the file is written under a temporary name and renamed, so readers never see a partial PDF.
+def render_report(report_type, entity_ids, path, database_url=DATABASE_URL):
+    if os.path.exists(path):
+        return path
+    pdf = REPORT_BUILDERS[report_type](get_engine(database_url), entity_ids)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as pdf_file:
+        pdf_file.write(pdf)
+    os.replace(tmp_path, path)
+    evict_older_versions(path)
+    return path
+
+# Background report rendering on a process pool (workers.spawn_pool). Cached reports resolve immediately; a
+# report that is already being rendered is shared rather than submitted twice.
+class ReportQueue:
+    def __init__(self, database_url=DATABASE_URL, cache_dir=REPORT_CACHE_DIR, max_workers=REPORT_WORKERS):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.database_url = database_url
+        self.cache_dir = cache_dir
+        self.executor = spawn_pool(max_workers)
+        self.jobs = {}
+        self.lock = threading.Lock()
+
+    def submit(self, report_type, entity_ids, version):
+        path = report_path(report_type, entity_ids, version, self.cache_dir)
+        if os.path.exists(path):
+            job = Future()
+            job.set_result(path)
+            return job
+        with self.lock:
+            job = self.jobs.get(path)
+            if job is None or (job.done() and job.exception() is not None):
+                job = self.executor.submit(render_report, report_type, tuple(int(i) for i in entity_ids), path,
+                                           self.database_url)
+                self.jobs[path] = job
+                job.add_done_callback(lambda done, path=path: self.forget(path, done))
+            return job
+
+    # Finished jobs are served from the cache file from now on; failed ones stay so the error can be shown
+    def forget(self, path, job):
+        if job.exception() is None:
+            with self.lock:
+                self.jobs.pop(path, None)
+
+    # One Client Report per client, rendered in parallel
+    def submit_clients(self, client_ids, version):
+        return {int(client_id): self.submit('client', [client_id], version) for client_id in client_ids}
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+# Bundle rendered reports into a zip archive; entries maps archive names to report paths
+def write_zip(entries, path):
+    with zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for name, report in entries.items():
+            archive.write(report, arcname=name)
+    return path
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render PDF reports into the report cache.")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--all-clients", action="store_true", help="Render a Client Report for every client.")
+    target.add_argument("--client", type=int, help="Render the Client Report of one client.")
+    target.add_argument("--protocols", type=int, nargs="+", help="Render a Protocol Efficacy report.")
+    parser.add_argument("--workers", type=int, default=REPORT_WORKERS, help="Worker processes.")
+    parser.add_argument("--database-url", default=DATABASE_URL, help="Database to report on.")
+    args = parser.parse_args()
+
+    if not PDF_AVAILABLE:
+        raise SystemExit("fpdf2 and kaleido are required to render PDF reports.")
+    engine = get_engine(args.database_url)
+    ensure_schema(engine)
+    version = data_version(engine)
+    queue = ReportQueue(args.database_url, max_workers=args.workers)
+    started = time.perf_counter()
+    if args.all_clients:
+        with engine.connect() as conn:
+            client_ids = conn.execute(select(Client.id).order_by(Client.id)).scalars().all()
+        jobs = list(queue.submit_clients(client_ids, version).values())
+    elif args.client is not None:
+        jobs = [queue.submit('client', [args.client], version)]
+    else:
+        jobs = [queue.submit('protocol_efficacy', args.protocols, version)]
+    for job in as_completed(jobs):
+        job.result()
+    elapsed = time.perf_counter() - started
+    queue.shutdown()
+    print(f"{len(jobs):,} reports ready in {queue.cache_dir} in {elapsed:.2f}s "
+          f"({len(jobs) / elapsed:.1f} reports/sec, {args.workers} workers).")
@@ -0,0 +1,126 @@
+# path/src/snapshot.py
+
+import os
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from sqlalchemy import select, func
+from config.settings import SNAPSHOT_PATH
+from create_db import ClientFormResponse, ensure_schema, update_counters
+from database import get_engine
+from queries import table_versions
+from fact_table import compact_fact_table, smallest_int_dtype, memory_mib
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow is optional; without it the app always reads from SQL
+    pa = pq = None
+
+# Columns of the answer fact table; the snapshot and the SQL fallback return exactly these
+FACT_COLUMNS = ['id', 'client_id', 'form_id', 'protocol_id', 'question_id', 'response_id', 'time_point', 'score']
+
+def fact_query():
+    table = ClientFormResponse.__table__
+    return select(*(table.c[column] for column in FACT_COLUMNS)).order_by(table.c.id)
+
+def read_fact_table(engine):
+    with engine.connect() as conn:
+        return pd.read_sql(fact_query(), conn)
+
+# The answers of one client, with the fact table's columns and compact dtypes
+def read_client_rows(engine, client_id):
+    query = fact_query().where(ClientFormResponse.__table__.c.client_id == int(client_id))
+    with engine.connect() as conn:
+        return compact_fact_table(pd.read_sql(query, conn))
+
+# Write counter of client_form_response, i.e. the last write to the fact table
+def fact_version(engine):
+    return table_versions(engine).get('client_form_response', 0)
+
+# Counter of updates and deletes of the fact table; inserts leave it alone (see create_db.update_counters)
+def fact_update_count(engine):
+    return table_versions(engine).get(update_counters['client_form_response'], 0)
+
+# Arrow types of the integer columns: the smallest holding each column's range in the database, as chosen for
+# the in-memory table (fact_table.smallest_int_dtype), and the highest id they were derived for
+def integer_types(engine):
+    table = ClientFormResponse.__table__
+    columns = [column for column in FACT_COLUMNS if column != 'time_point']
+    bounds = select(func.max(table.c.id), *(aggregate(table.c[column]) for column in columns
+                                            for aggregate in (func.min, func.max)))
+    with engine.connect() as conn:
+        max_id, *values = conn.execute(bounds).one()
+    types = {}
+    for position, column in enumerate(columns):
+        low, high = values[2 * position:2 * position + 2]
+        values_range = np.array([low, high]) if low is not None else np.array([], dtype=np.int64)
+        types[column] = pa.from_numpy_dtype(smallest_int_dtype(values_range))
+    return types, max_id or 0
+
+# Stream the fact table out of SQL in chunks into a Parquet file with a dictionary-encoded time_point. The
+# counters read before the export are stored in the file metadata for the checks of snapshot_is_usable. Rows
+# written during the export above the highest id seen up front are left out; loads fetch them from SQL.
+def export_snapshot(engine, path=SNAPSHOT_PATH, chunksize=500_000):
+    version, update_count = fact_version(engine), fact_update_count(engine)
+    types, max_id = integer_types(engine)
+    schema = pa.schema([(column, pa.dictionary(pa.int32(), pa.string()) if column == 'time_point' else types[column])
+                        for column in FACT_COLUMNS],
+                       metadata={'fact_version': str(version), 'update_count': str(update_count),
+                                 'max_id': str(max_id)})
+    query = fact_query().where(ClientFormResponse.__table__.c.id <= max_id)
+    tmp_path = f"{path}.tmp"
+    num_rows = 0
+    with engine.connect() as conn, pq.ParquetWriter(tmp_path, schema) as writer:
+        for chunk in pd.read_sql(query, conn, chunksize=chunksize):
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+            num_rows += len(chunk)
+    os.replace(tmp_path, path)
+    return num_rows
+
+# A snapshot is usable while no answer it holds has been updated or deleted since the export: it is then the
+# fact table up to its max_id, and only newer answers are missing. The rows at or below max_id are counted as
+# well, which catches a database replaced or written with its triggers dropped.
+def snapshot_is_usable(engine, path=SNAPSHOT_PATH):
+    if pq is None or not os.path.exists(path):
+        return False
+    metadata = pq.read_schema(path).metadata or {}
+    if b'update_count' not in metadata or int(metadata[b'update_count']) != fact_update_count(engine):
+        return False
+    table = ClientFormResponse.__table__
+    # All rows minus the few above max_id: a count of the whole table runs over its smallest index, while a
+    # range count walks the table itself
+    count = select(func.count()).select_from(table)
+    exported = count.scalar_subquery() - count.where(table.c.id > int(metadata[b'max_id'])).scalar_subquery()
+    with engine.connect() as conn:
+        return conn.execute(select(exported)).scalar() == pq.read_metadata(path).num_rows
+
+# Memory-map the snapshot; time_point comes back as a pandas categorical
+def load_snapshot(path=SNAPSHOT_PATH):
+    table = pq.read_table(path, memory_map=True, read_dictionary=['time_point'])
+    return table.to_pandas()
+
+# The fact table in its compact representation, from the snapshot when it is usable and from SQL otherwise.
+# A snapshot may lack the answers written since its export: callers fetch the rows above its highest id, as
+# IncrementalTable does right after loading.
+def load_fact_table(engine, path=SNAPSHOT_PATH):
+    source = 'snapshot' if snapshot_is_usable(engine, path) else 'SQL'
+    frame = load_snapshot(path) if source == 'snapshot' else read_fact_table(engine)
+    compact = compact_fact_table(frame)
+    print(f"Fact table loaded from {source}: {len(compact):,} rows, "
+          f"{memory_mib(frame):.1f} MiB -> {memory_mib(compact):.1f} MiB after compaction.")
+    return compact
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the answer fact table to a Parquet snapshot.")
+    parser.add_argument("--path", default=SNAPSHOT_PATH, help="Snapshot file to write.")
+    args = parser.parse_args()
+
+    if pq is None:
+        raise SystemExit("pyarrow is required to export snapshots.")
+    started = time.perf_counter()
+    engine = get_engine()
+    ensure_schema(engine)
+    num_rows = export_snapshot(engine, args.path)
+    print(f"Snapshot of {num_rows:,} rows written to {args.path} in {time.perf_counter() - started:.2f}s.")
@@ -0,0 +1,12 @@
+# path/src/workers.py
+
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+# Process pools of the report renderer and the bootstrap engine. Workers are spawned, not forked, so they
+# inherit no threads, pooled connections or Streamlit state from the server process. They run functions of
+# importable modules (reports, bootstrap) by name. A spawned worker also re-imports the parent's __main__,
+# which under Streamlit is the dashboard script; its page code sits behind an `if __name__ == "__main__"`
+# guard, so the workers only load its definitions.
+def spawn_pool(max_workers):
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'))
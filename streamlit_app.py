@@ -1,37 +1,293 @@
 # path/streamlit_app.py
 
+import os
+import sys
+import datetime
+import threading
+from functools import partial
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 import plotly.express as px
 import pandas as pd
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from config.settings import DATABASE_URL
+from config.settings import (BASE_DIR, LOAD_WORKERS, PERF_METRICS_PORT, RESPONDER_THRESHOLD, LOWER_SCORES_IMPROVE,
+                             BOOTSTRAP_WORKERS, EXPORT_DIR, EXPORT_MAX_AGE, EXPORT_DIR_MAX_MB, EXPORT_DOWNLOAD_MAX_MB)
 import io
 
-# Function to load data from the database
-@st.cache_data
-def load_data():
-    engine = create_engine(DATABASE_URL)
-    Session = sessionmaker(bind=engine)
-    session = Session()
-    
-    clients = pd.read_sql_table('client', engine)
-    forms = pd.read_sql_table('form', engine)
-    questions = pd.read_sql_table('question', engine)
-    responses = pd.read_sql_table('response', engine)
-    client_form_responses = pd.read_sql_table('client_form_response', engine)
-    protocols = pd.read_sql_table('protocol', engine)
-
-    session.close()
-    return clients, forms, questions, responses, client_form_responses, protocols
-
-# Initialize session state for wide mode
-if "wide_mode" not in st.session_state:
-    st.session_state.wide_mode = False
-
-# Set page configuration based on session state
-layout = 'wide' if st.session_state.wide_mode else 'centered'
-st.set_page_config(layout=layout)
+sys.path.append(os.path.join(BASE_DIR, 'src'))
+from aggregations import timepoint_scores, stats_from_sums, chart_frame, timepoint_change
+import queries
+import snapshot
+import outcomes
+import bootstrap
+import export
+import reports
+import perf
+from figures import timepoint_line_chart, score_histogram
+from client_index import ClientIndex
+from cohorts import ProtocolMembership, CohortScores, parse_cohort
+from incremental import IncrementalTable, BackgroundRefresh
+from concurrent_load import load_concurrently
+from fact_table import append_compact
+from create_db import Base, ClientFormResponse, ensure_schema, incremental_tables, update_counters
+from database import get_engine
+from workers import spawn_pool
+
+# One pooled engine per server process, shared by every session, with its statements timed. The schema is
+# brought up to date once, when the engine is created.
+@st.cache_resource(show_spinner=False)
+def get_db_engine():
+    engine = get_engine()
+    ensure_schema(engine)
+    return perf.instrument_engine(engine)
+
+# Prometheus endpoint for the process-wide performance numbers, when PERF_METRICS_PORT is set
+@st.cache_resource(show_spinner=False)
+def start_metrics_server():
+    return perf.serve_metrics(PERF_METRICS_PORT) if PERF_METRICS_PORT else None
+
+# Write counter of a table, bumped by triggers on every write. It is read on each rerun (a primary-key
+# lookup) and passed to the cached loaders below as part of their cache key, so a loader runs again only
+# after the data it reads has changed, and only for that table.
+def table_version(table_name):
+    return queries.table_versions(get_db_engine()).get(table_name, 0)
+
+# Append-mostly tables held in memory per server process and refreshed with only their new rows
+@st.cache_resource(show_spinner=False)
+def incremental_table(table_name):
+    return IncrementalTable(get_db_engine(), Base.metadata.tables[table_name], update_counters[table_name])
+
+# Function to load a whole table from the database
+@st.cache_data(max_entries=32, show_spinner=False)
+def read_table(table_name, version):
+    with perf.timed(f"read_table:{table_name}"):
+        if table_name in incremental_tables:
+            frame, _ = incremental_table(table_name).refresh()
+            return frame
+        engine = get_db_engine()
+        return pd.read_sql_table(table_name, engine)
+
+def load_table(table_name):
+    return read_table(table_name, table_version(table_name))
+
+# Answer fact table, memory-mapped from the Parquet snapshot (topped up with the answers added since) or read
+# from SQL, together with the answers grouped by client (slicing one client does not scan the whole table).
+# After that only new answers are fetched and appended to both. Held as a shared resource rather than copied
+# into every session; pages must not modify it. It is loaded and refreshed on a background thread the first
+# time Client Progress needs it, so no page waits for the whole table.
+@st.cache_resource(show_spinner=False)
+def fact_table_refresh():
+    table = ClientFormResponse.__table__
+    return BackgroundRefresh(partial(IncrementalTable, get_db_engine(), table, update_counters[table.name],
+                                     snapshot.FACT_COLUMNS, load=snapshot.load_fact_table, append=append_compact,
+                                     aggregates={'client_index': ClientIndex}))
+
+# Answers of one client read from SQL, while the client index is not yet current
+@st.cache_data(max_entries=64, show_spinner=False)
+def read_client_rows(client_id, version):
+    with perf.timed('read_client_rows'):
+        return snapshot.read_client_rows(get_db_engine(), client_id)
+
+# One client's answers: a binary search and a slice of the shared client index once it holds the current
+# answers, one indexed query (cached per client and version) until then
+def load_client_rows(client_id):
+    version = table_version('client_form_response')
+    current = fact_table_refresh().current(version)
+    if current is not None:
+        _, aggregates = current
+        return aggregates['client_index'].rows(client_id)
+    return read_client_rows(int(client_id), version)
+
+# Load the tables a page declares. They are independent, so on a cold cache they are fetched concurrently
+# (LOAD_WORKERS threads, one pooled connection each); the loader threads share this script run's context so
+# the Streamlit caches behave as in the script thread.
+@perf.timed('load_tables')
+def load_tables(table_names):
+    if not table_names:
+        return {}
+    ctx = get_script_run_ctx()
+    loaders = {table_name: partial(load_table, table_name) for table_name in table_names}
+    return load_concurrently(loaders, LOAD_WORKERS,
+                             initializer=lambda: add_script_run_ctx(threading.current_thread(), ctx))
+
+# Scores of one form, so the distribution page does not need the whole fact table
+@st.cache_data(max_entries=32, show_spinner=False)
+def read_form_scores(form_id, version):
+    with perf.timed('read_form_scores'):
+        return queries.form_scores(get_db_engine(), form_id)
+
+def load_form_scores(form_id):
+    return read_form_scores(int(form_id), table_version('client_form_response'))
+
+# Per-(entity, time point) score statistics aggregated in SQL; only the small result set is loaded.
+# Filters are tuples of ids so they can be part of the cache key.
+@st.cache_data(max_entries=256)
+def read_timepoint_stats(by, client_ids, protocol_ids, version):
+    engine = get_db_engine()
+    return stats_from_sums(queries.timepoint_sums(engine, by, client_ids=client_ids, protocol_ids=protocol_ids))
+
+def load_timepoint_stats(by, client_ids=None, protocol_ids=None):
+    return read_timepoint_stats(by, client_ids, protocol_ids, table_version('client_form_response'))
+
+@st.cache_data(max_entries=4)
+def read_summary_counts(versions):
+    engine = get_db_engine()
+    return queries.summary_counts(engine)
+
+def load_summary_counts():
+    versions = queries.table_versions(get_db_engine())
+    return read_summary_counts(tuple(versions.get(table_name, 0)
+                                     for table_name in ('client', 'client_form_response', 'form', 'protocol')))
+
+# Overview chart data: statistics per form or protocol and time point, with the entity names
+@st.cache_data(max_entries=8)
+def read_overview_scores(by, entity_table, versions):
+    fact_version, entity_version = versions
+    return chart_frame(read_timepoint_stats(by, None, None, fact_version), by, read_table(entity_table, entity_version))
+
+def overview_versions(entity_table):
+    versions = queries.table_versions(get_db_engine())
+    return versions.get('client_form_response', 0), versions.get(entity_table, 0)
+
+# Worker processes for the large bootstrap groups, started once per server process; None computes in-process
+@st.cache_resource(show_spinner=False)
+def get_bootstrap_pool():
+    return spawn_pool(BOOTSTRAP_WORKERS) if BOOTSTRAP_WORKERS > 1 else None
+
+# Bootstrap 95% confidence intervals of the average score per form or protocol and time point, resampling clients
+# from the per-client summary table; computed once per data version
+@st.cache_data(max_entries=4, show_spinner="Resampling clients for the confidence intervals...")
+def read_bootstrap_ci(by, version):
+    return bootstrap.bootstrap_ci(queries.client_timepoint_sums(get_db_engine(), by), by,
+                                  executor=get_bootstrap_pool())
+
+# Overview figure keyed on the data versions, the selected entities and the toggles. A checkbox toggle does
+# no data work, and a toggle state seen before is served without rebuilding the figure.
+@st.cache_data(max_entries=64)
+def overview_figure(by, entity_table, legend, selected, show_variance, show_counts, show_percentages, versions,
+                    show_ci=False):
+    scores = read_overview_scores(by, entity_table, versions)
+    scores = scores[scores['name'].isin(selected)]
+    if show_ci:
+        intervals = read_bootstrap_ci(by, versions[0])[[by, 'time_point', 'ci_lower', 'ci_upper']].copy()
+        intervals['time_point'] = intervals['time_point'].astype(scores['time_point'].dtype)
+        scores = scores.merge(intervals, on=[by, 'time_point'], how='left')
+    return timepoint_line_chart(scores, legend, show_variance=show_variance, show_counts=show_counts,
+                                show_percentages=show_percentages, show_ci=show_ci)
+
+# Dense client x form (or protocol) x time point array of per-client average scores, built once per data version
+# from the per-client summary table and shared by every session
+@st.cache_resource(max_entries=2, show_spinner=False)
+def read_score_cube(by, version):
+    with perf.timed(f"read_score_cube:{by}"):
+        return outcomes.score_cube(queries.client_timepoint_sums(get_db_engine(), by), by)
+
+# Change scores per entity and follow-up time point with the entity names; changing the threshold or the
+# direction only reruns the array reductions
+@st.cache_data(max_entries=64)
+def read_change_summary(by, entity_table, threshold, lower_is_better, versions):
+    fact_version, entity_version = versions
+    summary = outcomes.change_summary(read_score_cube(by, fact_version), threshold, lower_is_better)
+    return summary.merge(read_table(entity_table, entity_version)[['id', 'name']], left_on=by, right_on='id')
+
+def load_change_summary(by, entity_table, threshold=RESPONDER_THRESHOLD, lower_is_better=LOWER_SCORES_IMPROVE):
+    return read_change_summary(by, entity_table, threshold, lower_is_better, overview_versions(entity_table))
+
+# Short question labels for legends and tables: the id and the start of the question text
+def question_labels(questions):
+    text = questions['text'].fillna("")
+    short = text.where(text.str.len() <= 60, text.str.slice(0, 57) + "...")
+    return pd.DataFrame({'id': questions['id'], 'name': "Q" + questions['id'].astype(str) + ": " + short})
+
+# Trajectories of every question, from the question summary table (#questions x #time points rows). Cached
+# per data version and filtered per form in memory, so switching forms and questions does no data work.
+@st.cache_data(max_entries=4)
+def read_question_scores(versions):
+    fact_version, question_version = versions
+    labels = question_labels(read_table('question', question_version))
+    return chart_frame(read_timepoint_stats('question_id', None, None, fact_version), 'question_id', labels)
+
+def load_question_scores():
+    versions = queries.table_versions(get_db_engine())
+    return read_question_scores((versions.get('client_form_response', 0), versions.get('question', 0)))
+
+# Protocol membership bitsets and per-client score sums, built once per fact table version from the two small
+# membership and client summary tables and shared by every session. Cohort definitions are evaluated against
+# them in memory, so editing a definition does no data work.
+@st.cache_resource(max_entries=1, show_spinner=False)
+@perf.timed('read_cohort_scores')
+def read_cohort_scores(version):
+    engine = get_db_engine()
+    return CohortScores(queries.client_timepoint_sums(engine), ProtocolMembership(queries.client_protocols(engine)))
+
+def load_cohort_scores():
+    return read_cohort_scores(table_version('client_form_response'))
+
+# Background PDF rendering, one worker pool per server process
+@st.cache_resource
+def get_report_queue():
+    return reports.ReportQueue()
+
+# Submit a PDF report to the background workers; the job is kept in the session until it is downloaded
+def submit_report(report_type, entity_ids):
+    if not reports.PDF_AVAILABLE:
+        st.error("PDF reports require the optional fpdf2 and kaleido packages.")
+        return
+    version = reports.data_version(get_db_engine())
+    jobs = st.session_state.setdefault('report_jobs', {})
+    jobs[(report_type, tuple(entity_ids))] = get_report_queue().submit(report_type, entity_ids, version)
+    perf.count('reports_submitted')
+
+# Status of a submitted report: a refresh button while it renders, then a download button
+def show_report_job(report_type, entity_ids, file_name):
+    key = (report_type, tuple(entity_ids))
+    job = st.session_state.get('report_jobs', {}).get(key)
+    if job is None:
+        return
+    widget_key = f"{report_type}_{'_'.join(map(str, entity_ids))}"
+    if not job.done():
+        st.info("The report is being rendered in the background.")
+        st.button("Refresh", key=f"refresh_{widget_key}")
+    elif job.exception() is not None:
+        st.error(f"Report generation failed: {job.exception()}")
+    else:
+        with open(job.result(), 'rb') as pdf_file:
+            st.download_button("Download PDF Report", data=pdf_file, file_name=file_name, mime="application/pdf",
+                               key=f"download_{widget_key}")
+
+# Plotly figures are serialized for the browser in st.plotly_chart, which is timed separately from building them
+@perf.timed('render:plotly_chart')
+def show_chart(fig, **kwargs):
+    st.plotly_chart(fig, **kwargs)
+
+# Process-wide timings of the instrumented sections (cache misses only, for cached loaders) and counters,
+# with exports for scraping or offline comparison
+def performance_panel():
+    st.sidebar.title("Performance")
+    timings, counts = perf.snapshot()
+    if timings:
+        frame = pd.DataFrame(timings).set_index('section')
+        st.sidebar.dataframe(frame.style.format({'total_s': "{:.3f}", 'mean_s': "{:.4f}", 'max_s': "{:.3f}",
+                                                 'last_s': "{:.4f}"}))
+    else:
+        st.sidebar.write("Nothing timed yet.")
+    for name, value in sorted(counts.items()):
+        st.sidebar.write(f"**{name}:** {value:,}")
+    st.sidebar.download_button("Download Prometheus Metrics", data=perf.to_prometheus(), file_name="metrics.txt",
+                               mime="text/plain")
+    st.sidebar.download_button("Download JSON Metrics", data=perf.to_json(), file_name="metrics.json",
+                               mime="application/json")
+    if st.sidebar.button("Reset Performance Numbers"):
+        perf.reset()
+        st.experimental_rerun()
+
+# Change from Baseline per entity and follow-up time point, as a table
+def show_change_table(summary, legend):
+    columns = {'name': legend, 'time_point': "Follow-Up", 'clients': "Clients", 'mean_change': "Mean Change (points)",
+               'responder_rate': "Responders (%)", 'cohens_d': "Cohen's d", 'srm': "SRM"}
+    table = summary[list(columns)].rename(columns=columns)
+    table["Responders (%)"] = table["Responders (%)"] * 100
+    st.dataframe(table.style.format({"Mean Change (points)": "{:+.1f}", "Responders (%)": "{:.1f}",
+                                     "Cohen's d": "{:+.2f}", "SRM": "{:+.2f}"}, na_rep="-"), hide_index=True)
 
 # Functions for each page
 # Function to toggle wide mode
@@ -40,21 +296,18 @@ def toggle_wide_mode():
     st.experimental_rerun()
 
 # Overview page function
-def overview_page(clients, forms, questions, responses, client_form_responses, protocols):
+def overview_page():
     st.title("Overview")
     st.write("## Summary Statistics")
 
     # Summary Statistics Table
-    num_clients = len(clients)
-    num_questions_filled = len(client_form_responses)
-    total_forms = len(forms)
-    protocols_count = len(protocols)
+    counts = load_summary_counts()
 
     summary_data = {
-        "Total Clients": [num_clients],
-        "Questions Filled": [num_questions_filled],
-        "Total Forms": [total_forms],
-        "Total Protocols": [protocols_count]
+        "Total Clients": [counts['clients']],
+        "Questions Filled": [counts['answers']],
+        "Total Forms": [counts['forms']],
+        "Total Protocols": [counts['protocols']]
     }
     
     summary_df = pd.DataFrame(summary_data)
@@ -67,6 +320,10 @@ def overview_page(clients, forms, questions, responses, client_form_responses, p
                               help="Toggle to display the number of responses (n) at each time point on the graph.")
     show_percentages = st.checkbox("Show Percentages at Each Time Point", value=False, 
                                    help="Toggle to display the average percentage score at each time point on the graph.")
+    show_ci = st.checkbox("Show 95% CI", value=False,
+                          help="Toggle to display bootstrap 95% confidence intervals of the average scores, from "
+                               "resampling clients with replacement. Computed once per data change, which takes a few "
+                               "seconds for large databases.")
 
     if st.session_state.wide_mode:
         col1, col2 = st.columns(2)
@@ -79,55 +336,20 @@ def overview_page(clients, forms, questions, responses, client_form_responses, p
                 "You can filter the forms displayed using the dropdown menu. Use the checkboxes to toggle the display of variance bars, "
                 "number of responses (n), and percentage scores at each time point.")
 
-        # Calculating average scores and counts
-        avg_scores = client_form_responses.groupby(['form_id', 'time_point']).apply(
-            lambda x: x['response_id'].map(responses.set_index('id')['text'].astype(int)).mean() * 100 / 4
-        ).reset_index(name='average_score')
-        
-        counts = client_form_responses.groupby(['form_id', 'time_point']).size().reset_index(name='count')
-        scores_with_counts = avg_scores.merge(counts, on=['form_id', 'time_point'])
-        scores_with_counts = scores_with_counts.merge(forms, left_on='form_id', right_on='id')
-
-        # Calculating standard deviation for variance bars
-        std_devs = client_form_responses.groupby(['form_id', 'time_point']).apply(
-            lambda x: x['response_id'].map(responses.set_index('id')['text'].astype(int)).std() * 100 / 4
-        ).reset_index(name='std_dev')
-        scores_with_counts = scores_with_counts.merge(std_devs, on=['form_id', 'time_point'])
-
-        # Sorting time points
-        time_points_order = ["Baseline", "1-Month", "3-Months", "6-Months", "1-Year"]
-        scores_with_counts['time_point'] = pd.Categorical(scores_with_counts['time_point'], categories=time_points_order, ordered=True)
-        scores_with_counts = scores_with_counts.sort_values('time_point')
+        # Average scores, counts and standard deviations per form and time point
+        form_versions = overview_versions('form')
+        scores_with_counts = read_overview_scores('form_id', 'form', form_versions)
 
         # Form checkboxes
         form_names = scores_with_counts['name'].unique()
         selected_forms = st.multiselect("Select Forms to Display", form_names, default=form_names,
                                         help="Select which forms' data you want to visualize.")
 
-        # Filter data based on selected forms
-        filtered_data = scores_with_counts[scores_with_counts['name'].isin(selected_forms)]
-
         # Plotting with variance bars
-        fig = px.line(filtered_data, x='time_point', y='average_score', color='name',
-                      labels={'time_point': 'Time Point', 'average_score': 'Average Score (%)', 'name': 'Form'})
-        
-        # Adding variance bars, counts, and percentages
-        for form_name in selected_forms:
-            form_data = filtered_data[filtered_data['name'] == form_name]
-            if show_variance_bars:
-                fig.add_scatter(x=form_data['time_point'], y=form_data['average_score'],
-                                error_y=dict(type='data', array=form_data['std_dev']),
-                                mode='markers', name=f"{form_name} (Variance)")
-            if show_counts:
-                for idx, row in form_data.iterrows():
-                    fig.add_annotation(x=row['time_point'], y=row['average_score'],
-                                       text=f"N={row['count']}", showarrow=False, yshift=10)
-            if show_percentages:
-                for idx, row in form_data.iterrows():
-                    fig.add_annotation(x=row['time_point'], y=row['average_score'],
-                                       text=f"{row['average_score']:.2f}%", showarrow=False, yshift=-10)
-
-        st.plotly_chart(fig)
+        fig = overview_figure('form_id', 'form', 'Form', tuple(selected_forms), show_variance_bars, show_counts,
+                              show_percentages, form_versions, show_ci)
+
+        show_chart(fig)
 
     with col2:
         st.write("## Protocol Responses Over Time")
@@ -135,51 +357,45 @@ def overview_page(clients, forms, questions, responses, client_form_responses, p
                 "You can filter the protocols displayed using the dropdown menu. Use the checkboxes to toggle the display of variance bars, "
                 "number of responses (n), and percentage scores at each time point.")
 
-        # Calculating average scores and counts per protocol
-        avg_scores_protocols = client_form_responses.groupby(['protocol_id', 'time_point']).apply(
-            lambda x: x['response_id'].map(responses.set_index('id')['text'].astype(int)).mean() * 100 / 4
-        ).reset_index(name='average_score')
-        
-        counts_protocols = client_form_responses.groupby(['protocol_id', 'time_point']).size().reset_index(name='count')
-        scores_with_counts_protocols = avg_scores_protocols.merge(counts_protocols, on=['protocol_id', 'time_point'])
-        scores_with_counts_protocols = scores_with_counts_protocols.merge(protocols, left_on='protocol_id', right_on='id')
-
-        # Calculating standard deviation for variance bars per protocol
-        std_devs_protocols = client_form_responses.groupby(['protocol_id', 'time_point']).apply(
-            lambda x: x['response_id'].map(responses.set_index('id')['text'].astype(int)).std() * 100 / 4
-        ).reset_index(name='std_dev')
-        scores_with_counts_protocols = scores_with_counts_protocols.merge(std_devs_protocols, on=['protocol_id', 'time_point'])
-
-        scores_with_counts_protocols['time_point'] = pd.Categorical(scores_with_counts_protocols['time_point'], categories=time_points_order, ordered=True)
-        scores_with_counts_protocols = scores_with_counts_protocols.sort_values('time_point')
+        # Average scores, counts and standard deviations per protocol and time point
+        protocol_versions = overview_versions('protocol')
+        scores_with_counts_protocols = read_overview_scores('protocol_id', 'protocol', protocol_versions)
 
         protocol_names = scores_with_counts_protocols['name'].unique()
         selected_protocols = st.multiselect("Select Protocols to Display", protocol_names, default=protocol_names,
                                             help="Select which protocols' data you want to visualize.")
 
-        filtered_protocol_data = scores_with_counts_protocols[scores_with_counts_protocols['name'].isin(selected_protocols)]
-
-        fig_protocols = px.line(filtered_protocol_data, x='time_point', y='average_score', color='name',
-                                labels={'time_point': 'Time Point', 'average_score': 'Average Score (%)', 'name': 'Protocol'})
-        
-        for protocol_name in selected_protocols:
-            protocol_data = filtered_protocol_data[filtered_protocol_data['name'] == protocol_name]
-            if show_variance_bars:
-                fig_protocols.add_scatter(x=protocol_data['time_point'], y=protocol_data['average_score'],
-                                          error_y=dict(type='data', array=protocol_data['std_dev']),
-                                          mode='markers', name=f"{protocol_name} (Variance)")
-            if show_counts:
-                for idx, row in protocol_data.iterrows():
-                    fig_protocols.add_annotation(x=row['time_point'], y=row['average_score'],
-                                                 text=f"N={row['count']}", showarrow=False, yshift=10)
-            if show_percentages:
-                for idx, row in protocol_data.iterrows():
-                    fig_protocols.add_annotation(x=row['time_point'], y=row['average_score'],
-                                                 text=f"{row['average_score']:.2f}%", showarrow=False, yshift=-10)
-
-        st.plotly_chart(fig_protocols)
-
-def form_response_distribution(forms, client_form_responses, responses, questions):
+        fig_protocols = overview_figure('protocol_id', 'protocol', 'Protocol', tuple(selected_protocols),
+                                        show_variance_bars, show_counts, show_percentages, protocol_versions, show_ci)
+
+        show_chart(fig_protocols)
+
+    # Per-client outcomes rather than pooled means. Off by default: it reads the per-client summary table, which
+    # is far larger than the pooled ones the charts above use.
+    st.write("## Change From Baseline")
+    show_change = st.checkbox("Show Change From Baseline", value=False,
+                              help="Toggle to compute each client's change from Baseline to every later time point, "
+                                   "with responder rates and effect sizes per form and protocol.")
+    if show_change:
+        change_from_baseline()
+
+def change_from_baseline():
+    st.info("Changes are in percentage points of the maximum score, over the clients with answers at Baseline and at "
+            "the follow-up. Responders improved by more than the threshold. Cohen's d divides the mean change by the "
+            "standard deviation of the same clients' Baseline scores; the standardized response mean (SRM) by the "
+            "standard deviation of the change.")
+    threshold = st.slider("Responder Threshold (points)", min_value=0.0, max_value=50.0,
+                          value=float(RESPONDER_THRESHOLD), step=1.0,
+                          help="Improvement from Baseline, in percentage points, that makes a client a responder.")
+    lower_is_better = st.checkbox("Lower Scores Mean Improvement", value=LOWER_SCORES_IMPROVE,
+                                  help="Tick for symptom scales, where a falling score is an improvement.")
+    form_tab, protocol_tab = st.tabs(["Forms", "Protocols"])
+    with form_tab:
+        show_change_table(load_change_summary('form_id', 'form', threshold, lower_is_better), "Form")
+    with protocol_tab:
+        show_change_table(load_change_summary('protocol_id', 'protocol', threshold, lower_is_better), "Protocol")
+
+def form_response_distribution(forms):
     st.title("Form Response Distribution")
 
     st.info("This section allows you to explore the distribution of responses for different forms. "
@@ -189,9 +405,8 @@ def form_response_distribution(forms, client_form_responses, responses, question
     selected_form = st.selectbox("Select Form", forms['name'], help="Select a form to see the distribution of responses.")
     form_id = forms[forms['name'] == selected_form]['id'].values[0]
 
-    # Filter responses for the selected form
-    form_responses = client_form_responses[client_form_responses['form_id'] == form_id]
-    response_ids = form_responses['response_id'].map(responses.set_index('id')['text'].astype(int)).to_frame()
+    # Scores of the selected form
+    response_ids = load_form_scores(form_id).to_frame()
     response_ids.columns = ['Response Score']
 
     # Checkboxes for additional visualizations and statistics
@@ -206,22 +421,24 @@ def form_response_distribution(forms, client_form_responses, responses, question
     if show_histogram:
         with col1:
             st.write("### Histogram of Response Scores")
-            fig_histogram = px.histogram(response_ids, x='Response Score', nbins=10, labels={'Response Score': 'Response Score'})
-            st.plotly_chart(fig_histogram)
+            fig_histogram = score_histogram(response_ids['Response Score'])
+            show_chart(fig_histogram)
 
     if show_boxplot:
         with col2:
             st.write("### Box Plot of Response Scores")
-            fig_boxplot = px.box(response_ids, y='Response Score', labels={'Response Score': 'Response Score'})
-            st.plotly_chart(fig_boxplot)
+            with perf.timed('figure:box_plot'):
+                fig_boxplot = px.box(response_ids, y='Response Score', labels={'Response Score': 'Response Score'})
+            show_chart(fig_boxplot)
 
     if show_bar_chart:
         with col1:
             st.write("### Bar Chart of Response Counts")
             response_counts = response_ids['Response Score'].value_counts().reset_index()
             response_counts.columns = ['Response Score', 'Count']
-            fig_bar_chart = px.bar(response_counts, x='Response Score', y='Count', labels={'Response Score': 'Response Score', 'Count': 'Count'})
-            st.plotly_chart(fig_bar_chart)
+            with perf.timed('figure:bar_chart'):
+                fig_bar_chart = px.bar(response_counts, x='Response Score', y='Count', labels={'Response Score': 'Response Score', 'Count': 'Count'})
+            show_chart(fig_bar_chart)
 
     if show_statistics:
         with col2:
@@ -233,7 +450,7 @@ def form_response_distribution(forms, client_form_responses, responses, question
             st.write(f"**Median:** {median_score:.2f}")
             st.write(f"**Mode:** {mode_score:.2f}")
 
-def client_progress_over_time(clients, client_form_responses, responses, questions):
+def client_progress_over_time(clients, forms, protocols):
     st.title("Client Progress Over Time")
     st.info("This section allows facilitators to view detailed progress data for individual clients over different time points. "
             "Select a client from the dropdown menu to visualize their data.")
@@ -248,6 +465,8 @@ def client_progress_over_time(clients, client_form_responses, responses, questio
     st.write(f"**Name:** {client_info['name'].values[0]}")
     st.write(f"**Email:** {client_info['email'].values[0]}")
 
+    client_rows = load_client_rows(client_id)
+
     st.write("---")
 
     # Tabs for different views
@@ -256,15 +475,13 @@ def client_progress_over_time(clients, client_form_responses, responses, questio
     with tabs[0]:
         st.subheader("Protocols Over Time")
         st.write("### Filter by Protocol")
-        protocol_names = client_form_responses.merge(protocols, left_on='protocol_id', right_on='id')['name'].unique()
+        protocol_names = protocols[protocols['id'].isin(client_rows['protocol_id'].unique())]['name'].unique()
         selected_protocols = st.multiselect("Select Protocols to Display", protocol_names, default=protocol_names,
                                             help="Select which protocols' data you want to visualize for this client.")
         
         # Filter data based on selected protocols
-        client_data = client_form_responses[(client_form_responses['client_id'] == client_id) & 
-                                            (client_form_responses['protocol_id'].isin(
-                                                protocols[protocols['name'].isin(selected_protocols)]['id'].values))]
-        client_data = client_data.merge(responses, left_on='response_id', right_on='id')
+        client_data = client_rows[client_rows['protocol_id'].isin(
+            protocols[protocols['name'].isin(selected_protocols)]['id'].values)]
 
         # Variance bars and counts checkboxes for protocols
         show_variance_bars_protocols = st.checkbox("Show Variance Bars (Protocols)", value=False, 
@@ -274,62 +491,26 @@ def client_progress_over_time(clients, client_form_responses, responses, questio
         show_percentages_protocols = st.checkbox("Show Percentages at Each Time Point (Protocols)", value=False, 
                                                  help="Toggle to display the average percentage score at each time point on the protocol graph.")
 
-        # Calculating average scores and counts per form
-        avg_scores = client_data.groupby(['form_id', 'time_point']).apply(
-            lambda x: x['response_id'].map(responses.set_index('id')['text'].astype(int)).mean() * 100 / 4
-        ).reset_index()
-        avg_scores.columns = ['form_id', 'time_point', 'average_score']
-        
-        counts = client_data.groupby(['form_id', 'time_point']).size().reset_index()
-        counts.columns = ['form_id', 'time_point', 'count']
-        scores_with_counts = avg_scores.merge(counts, on=['form_id', 'time_point'])
-        scores_with_counts = scores_with_counts.merge(forms, left_on='form_id', right_on='id')
-
-        # Calculating standard deviation for variance bars
-        std_devs = client_data.groupby(['form_id', 'time_point']).apply(
-            lambda x: x['response_id'].map(responses.set_index('id')['text'].astype(int)).std() * 100 / 4
-        ).reset_index()
-        std_devs.columns = ['form_id', 'time_point', 'std_dev']
-        scores_with_counts = scores_with_counts.merge(std_devs, on=['form_id', 'time_point'])
-
-        # Sorting time points
-        time_points_order = ["Baseline", "1-Month", "3-Months", "6-Months", "1-Year"]
-        scores_with_counts['time_point'] = pd.Categorical(scores_with_counts['time_point'], categories=time_points_order, ordered=True)
-        scores_with_counts = scores_with_counts.sort_values('time_point')
+        # Average scores, counts and standard deviations per form and time point
+        scores_with_counts = timepoint_scores(client_data, 'form_id', forms)
 
         # Plotting line chart with variance bars (Per Protocol)
-        fig_protocols = px.line(scores_with_counts, x='time_point', y='average_score', color='name',
-                                labels={'time_point': 'Time Point', 'average_score': 'Average Score (%)', 'name': 'Form'})
-        
-        for form_name in scores_with_counts['name'].unique():
-            form_data = scores_with_counts[scores_with_counts['name'] == form_name]
-            if show_variance_bars_protocols:
-                fig_protocols.add_scatter(x=form_data['time_point'], y=form_data['average_score'],
-                                          error_y=dict(type='data', array=form_data['std_dev']),
-                                          mode='markers', name=f"{form_name} (Variance)")
-            if show_counts_protocols:
-                for idx, row in form_data.iterrows():
-                    fig_protocols.add_annotation(x=row['time_point'], y=row['average_score'],
-                                                 text=f"N={row['count']}", showarrow=False, yshift=10)
-            if show_percentages_protocols:
-                for idx, row in form_data.iterrows():
-                    fig_protocols.add_annotation(x=row['time_point'], y=row['average_score'],
-                                                 text=f"{row['average_score']:.2f}%", showarrow=False, yshift=-10)
-
-        st.plotly_chart(fig_protocols, use_container_width=True)
+        fig_protocols = timepoint_line_chart(scores_with_counts, 'Form', show_variance=show_variance_bars_protocols,
+                                             show_counts=show_counts_protocols,
+                                             show_percentages=show_percentages_protocols)
+
+        show_chart(fig_protocols, use_container_width=True)
 
     with tabs[1]:
         st.subheader("Forms Over Time")
         st.write("### Filter by Form")
-        form_names = client_form_responses.merge(forms, left_on='form_id', right_on='id')['name'].unique()
+        form_names = forms[forms['id'].isin(client_rows['form_id'].unique())]['name'].unique()
         selected_forms = st.multiselect("Select Forms to Display", form_names, default=form_names,
                                         help="Select which forms' data you want to visualize for this client.")
 
         # Filter data based on selected forms
-        client_data_forms = client_form_responses[(client_form_responses['client_id'] == client_id) & 
-                                                  (client_form_responses['form_id'].isin(
-                                                      forms[forms['name'].isin(selected_forms)]['id'].values))]
-        client_data_forms = client_data_forms.merge(responses, left_on='response_id', right_on='id')
+        client_data_forms = client_rows[client_rows['form_id'].isin(
+            forms[forms['name'].isin(selected_forms)]['id'].values)]
 
         # Variance bars and counts checkboxes for forms
         show_variance_bars_forms = st.checkbox("Show Variance Bars (Forms)", value=False, 
@@ -339,60 +520,27 @@ def client_progress_over_time(clients, client_form_responses, responses, questio
         show_percentages_forms = st.checkbox("Show Percentages at Each Time Point (Forms)", value=False, 
                                              help="Toggle to display the average percentage score at each time point on the form graph.")
 
-        # Calculating average scores and counts per form
-        avg_scores_forms = client_data_forms.groupby(['form_id', 'time_point']).apply(
-            lambda x: x['response_id'].map(responses.set_index('id')['text'].astype(int)).mean() * 100 / 4
-        ).reset_index()
-        avg_scores_forms.columns = ['form_id', 'time_point', 'average_score']
-        
-        counts_forms = client_data_forms.groupby(['form_id', 'time_point']).size().reset_index()
-        counts_forms.columns = ['form_id', 'time_point', 'count']
-        scores_with_counts_forms = avg_scores_forms.merge(counts_forms, on=['form_id', 'time_point'])
-        scores_with_counts_forms = scores_with_counts_forms.merge(forms, left_on='form_id', right_on='id')
-
-        # Calculating standard deviation for variance bars
-        std_devs_forms = client_data_forms.groupby(['form_id', 'time_point']).apply(
-            lambda x: x['response_id'].map(responses.set_index('id')['text'].astype(int)).std() * 100 / 4
-        ).reset_index()
-        std_devs_forms.columns = ['form_id', 'time_point', 'std_dev']
-        scores_with_counts_forms = scores_with_counts_forms.merge(std_devs_forms, on=['form_id', 'time_point'])
-
-        # Sorting time points
-        scores_with_counts_forms['time_point'] = pd.Categorical(scores_with_counts_forms['time_point'], categories=time_points_order, ordered=True)
-        scores_with_counts_forms = scores_with_counts_forms.sort_values('time_point')
+        # Average scores, counts and standard deviations per form and time point
+        scores_with_counts_forms = timepoint_scores(client_data_forms, 'form_id', forms)
 
         # Plotting line chart with variance bars (Per Form)
-        fig_forms = px.line(scores_with_counts_forms, x='time_point', y='average_score', color='name',
-                            labels={'time_point': 'Time Point', 'average_score': 'Average Score (%)', 'name': 'Form'})
-        
-        for form_name in scores_with_counts_forms['name'].unique():
-            form_data = scores_with_counts_forms[scores_with_counts_forms['name'] == form_name]
-            if show_variance_bars_forms:
-                fig_forms.add_scatter(x=form_data['time_point'], y=form_data['average_score'],
-                                      error_y=dict(type='data', array=form_data['std_dev']),
-                                      mode='markers', name=f"{form_name} (Variance)")
-            if show_counts_forms:
-                for idx, row in form_data.iterrows():
-                    fig_forms.add_annotation(x=row['time_point'], y=row['average_score'],
-                                             text=f"N={row['count']}", showarrow=False, yshift=10)
-            if show_percentages_forms:
-                for idx, row in form_data.iterrows():
-                    fig_forms.add_annotation(x=row['time_point'], y=row['average_score'],
-                                             text=f"{row['average_score']:.2f}%", showarrow=False, yshift=-10)
-
-        st.plotly_chart(fig_forms, use_container_width=True)
+        fig_forms = timepoint_line_chart(scores_with_counts_forms, 'Form', show_variance=show_variance_bars_forms,
+                                         show_counts=show_counts_forms, show_percentages=show_percentages_forms)
+
+        show_chart(fig_forms, use_container_width=True)
 
     with tabs[2]:
         st.subheader("Response Distribution")
         st.write("### Histogram of Response Scores")
-        response_ids = client_data['response_id'].map(responses.set_index('id')['text'].astype(int)).to_frame()
+        response_ids = client_data['score'].to_frame()
         response_ids.columns = ['Response Score']
-        fig_histogram = px.histogram(response_ids, x='Response Score', nbins=10, labels={'Response Score': 'Response Score'})
-        st.plotly_chart(fig_histogram, use_container_width=True)
+        fig_histogram = score_histogram(response_ids['Response Score'])
+        show_chart(fig_histogram, use_container_width=True)
 
         st.write("### Box Plot of Response Scores")
-        fig_boxplot = px.box(response_ids, y='Response Score', labels={'Response Score': 'Response Score'})
-        st.plotly_chart(fig_boxplot, use_container_width=True)
+        with perf.timed('figure:box_plot'):
+            fig_boxplot = px.box(response_ids, y='Response Score', labels={'Response Score': 'Response Score'})
+        show_chart(fig_boxplot, use_container_width=True)
 
     with tabs[3]:
         st.subheader("Statistics")
@@ -408,7 +556,127 @@ def client_progress_over_time(clients, client_form_responses, responses, questio
         st.subheader("Export Report")
         st.write("### Export Client Report")
         if st.button("Export Report as PDF", help="Export the client's data and visualizations as a PDF report."):
-            st.write("Feature not implemented yet.")
+            submit_report('client', [int(client_id)])
+        show_report_job('client', [int(client_id)], f"{selected_client}_report.pdf")
+
+# Question analytics page function
+def question_analytics(forms, form_questions):
+    st.title("Question Analytics")
+    st.info("This section shows how each question of a form changes over time, to spot which items drive the "
+            "change in the form's score. Questions are ranked by the change in their average score from the "
+            "first to the last time point.")
+
+    selected_form = st.selectbox("Select Form", forms['name'], key="question_form",
+                                 help="Select a form to analyse its questions.")
+    form_id = forms[forms['name'] == selected_form]['id'].values[0]
+
+    question_ids = form_questions.loc[form_questions['form_id'] == form_id, 'question_id']
+    question_scores = load_question_scores()
+    form_scores = question_scores[question_scores['question_id'].isin(question_ids)]
+    if form_scores.empty:
+        st.write("No answers to this form yet.")
+        return
+
+    # Change per question, largest first
+    st.write("### Change per Question")
+    change = timepoint_change(form_scores, 'question_id')
+    st.dataframe(
+        change[['name', 'first_score', 'last_score', 'change', 'count']].rename(columns={
+            'name': "Question", 'first_score': "First Average (%)", 'last_score': "Last Average (%)",
+            'change': "Change (points)", 'count': "Responses",
+        }).style.format({"First Average (%)": "{:.1f}", "Last Average (%)": "{:.1f}", "Change (points)": "{:+.1f}"}),
+        hide_index=True,
+    )
+
+    # Trajectories of the selected questions, by default the ones that changed most
+    st.write("### Question Trajectories")
+    selected_questions = st.multiselect("Select Questions to Display", change['name'],
+                                        default=change['name'].head(5).tolist(),
+                                        help="Select which questions' average scores you want to visualize.")
+    show_variance_bars = st.checkbox("Show Variance Bars (Questions)", value=False,
+                                     help="Toggle to display variance bars on the question graph.")
+    show_counts = st.checkbox("Show Response Counts (n) (Questions)", value=False,
+                              help="Toggle to display the number of responses (n) at each time point.")
+
+    fig = timepoint_line_chart(form_scores[form_scores['name'].isin(selected_questions)], 'Question',
+                               show_variance=show_variance_bars, show_counts=show_counts)
+    fig.update_layout(legend=dict(orientation='h', yanchor='top', y=-0.2))
+    show_chart(fig, use_container_width=True)
+
+# Cohort comparison page function
+def cohort_comparison(forms, protocols):
+    st.title("Cohort Comparison")
+    st.info("This section compares groups of clients defined by the protocols they took. Combine protocol names "
+            "with AND, OR, NOT and parentheses, e.g. PTSD Protocol AND NOT Depression Protocol; ALL stands for "
+            "every client with answers. Names containing these words must be quoted.")
+    st.caption("Protocols: " + ", ".join(protocols['name']))
+
+    cohort_scores = load_cohort_scores()
+    membership = cohort_scores.membership
+    protocol_ids = dict(zip(protocols['name'], protocols['id']))
+    example = protocols['name'].iloc[1] if len(protocols) > 1 else "ALL"
+
+    col1, col2 = st.columns(2)
+    with col1:
+        text_a = st.text_input("Cohort A", value=example, help="Protocols the clients of cohort A took.")
+    with col2:
+        text_b = st.text_input("Cohort B", value=f"NOT {example}", help="Protocols the clients of cohort B took.")
+
+    cohorts = {}
+    for label, text in (("Cohort A", text_a), ("Cohort B", text_b)):
+        try:
+            cohorts[label] = parse_cohort(text, protocol_ids)
+        except ValueError as error:
+            st.error(f"{label}: {error}")
+    if len(cohorts) < 2:
+        return
+
+    # Cohort sizes, out of the clients with answers
+    num_clients = len(membership.client_ids)
+    sizes = {label: membership.size(definition) for label, definition in cohorts.items()}
+    sizes["In Both"] = membership.size(('and', *cohorts.values()))
+    st.table(pd.DataFrame({
+        "Cohort": list(sizes),
+        "Clients": [f"{size:,}" for size in sizes.values()],
+        "Share of Clients": [f"{size / num_clients:.1%}" if num_clients else "-" for size in sizes.values()],
+    }))
+
+    # Trajectories of both cohorts on one form, or pooled over all forms
+    answered_forms = forms[forms['id'].isin(cohort_scores.form_ids)]
+    selected_form = st.selectbox("Select Form", ["All Forms"] + answered_forms['name'].tolist(), key="cohort_form",
+                                 help="Select a form to compare the cohorts on, or pool the scores of all forms.")
+    show_variance_bars = st.checkbox("Show Variance Bars (Cohorts)", value=False,
+                                     help="Toggle to display variance bars on the cohort graph.")
+    show_counts = st.checkbox("Show Response Counts (n) (Cohorts)", value=False,
+                              help="Toggle to display the number of responses (n) at each time point.")
+    show_percentages = st.checkbox("Show Percentages at Each Time Point (Cohorts)", value=False,
+                                   help="Toggle to display the average percentage score at each time point.")
+
+    cohort_sums = []
+    for position, definition in enumerate(cohorts.values()):
+        sums = cohort_scores.cohort_sums(definition)
+        if selected_form == "All Forms":
+            sums = sums.groupby('time_point', as_index=False)[['n', 'score_sum', 'score_sq_sum']].sum()
+        else:
+            form_id = answered_forms.loc[answered_forms['name'] == selected_form, 'id'].values[0]
+            sums = sums[sums['form_id'] == form_id].drop(columns='form_id')
+        cohort_sums.append(sums.assign(cohort=position))
+    labels = pd.DataFrame({'id': range(len(cohorts)), 'name': list(cohorts)})
+    scores = chart_frame(stats_from_sums(pd.concat(cohort_sums, ignore_index=True)), 'cohort', labels)
+    if scores.empty:
+        st.write("Neither cohort has answers to this form.")
+        return
+
+    fig = timepoint_line_chart(scores, 'Cohort', show_variance=show_variance_bars, show_counts=show_counts,
+                               show_percentages=show_percentages)
+    show_chart(fig, use_container_width=True)
+
+    columns = {'name': "Cohort", 'time_point': "Time Point", 'average_score': "Average (%)",
+               'std_dev': "Std Dev (%)", 'count': "Responses"}
+    if 'clients' in scores:
+        columns['clients'] = "Clients"
+    st.dataframe(scores[list(columns)].rename(columns=columns)
+                 .style.format({"Average (%)": "{:.1f}", "Std Dev (%)": "{:.1f}"}), hide_index=True)
 
 # Data export page function
 # path/streamlit_app.py
@@ -416,14 +684,49 @@ def client_progress_over_time(clients, client_form_responses, responses, questio
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from config.settings import DATABASE_URL
 import io
 
 
+# New file for a download in the export directory, which is pruned first (see config/settings.py)
+def new_export_path(suffix):
+    return export.new_export_path(EXPORT_DIR, suffix, EXPORT_MAX_AGE, EXPORT_DIR_MAX_MB * 1024 * 1024)
+
+# Download button for a file in the export directory. Streamlit reads the whole file into memory every time
+# the button is drawn, so a file above EXPORT_DOWNLOAD_MAX_MB is left on the server instead.
+def download_file(label, path, file_name, mime):
+    size_mb = os.path.getsize(path) / (1024 * 1024)
+    if size_mb > EXPORT_DOWNLOAD_MAX_MB:
+        st.warning(f"The file is {size_mb:,.1f} MB, above the {EXPORT_DOWNLOAD_MAX_MB:,} MB download limit "
+                   f"(EXPORT_DOWNLOAD_MAX_MB). Narrow or compress the export, or fetch it from the server: {path}")
+        return
+    with open(path, 'rb') as download:
+        st.download_button(label, data=download, file_name=file_name, mime=mime)
+
+# Progress of the all-clients batch, and a zip of the reports once every one is rendered
+def show_batch_reports(clients):
+    jobs = st.session_state.get('batch_reports')
+    if not jobs:
+        return
+    finished = [job for job in jobs.values() if job.done()]
+    st.progress(len(finished) / len(jobs), text=f"{len(finished)} of {len(jobs)} reports rendered")
+    if len(finished) < len(jobs):
+        st.button("Refresh", key="refresh_batch_reports")
+        return
+    failed = [client_id for client_id, job in jobs.items() if job.exception() is not None]
+    if failed:
+        st.error(f"{len(failed)} reports failed: {jobs[failed[0]].exception()}")
+        return
+    if 'batch_zip' not in st.session_state:
+        names = clients.set_index('id')['name']
+        path = new_export_path(".zip")
+        st.session_state.batch_zip = reports.write_zip(
+            {f"{client_id}_{names[client_id]}_report.pdf": job.result() for client_id, job in jobs.items()}, path)
+    if os.path.exists(st.session_state.batch_zip):
+        download_file("Download All Client Reports", st.session_state.batch_zip, "client_reports.zip",
+                      "application/zip")
+
 # Data export page function
-def data_export(clients, forms, questions, responses, client_form_responses, protocols):
+def data_export(clients, forms, protocols):
     st.title("Data Export and Report Generation")
     st.info("This section allows facilitators to export client data in .csv format and generate reports in PDF format.")
 
@@ -433,47 +736,57 @@ def data_export(clients, forms, questions, responses, client_form_responses, pro
     with tab1:
         st.subheader("Export Data to CSV")
 
-        # Client selection
-        selected_client = st.selectbox("Select Client", clients['name'], help="Select a client to view and export their data.")
-        client_id = clients[clients['name'] == selected_client]['id'].values[0]
-
-        # Filter client data
-        client_data = client_form_responses[client_form_responses['client_id'] == client_id]
-
-        # Merge necessary tables
-        client_data = client_data.merge(responses, left_on='response_id', right_on='id', suffixes=('', '_response'))
-        client_data = client_data.merge(questions, left_on='question_id', right_on='id', suffixes=('', '_question'))
-        client_data = client_data.merge(forms, left_on='form_id', right_on='id', suffixes=('', '_form'))
-        client_data = client_data.merge(protocols, left_on='protocol_id', right_on='id', suffixes=('', '_protocol'))
-
-        # Rename columns for readability
-        client_data.rename(columns={
-            'name': 'Client Name', 
-            'email': 'Email', 
-            'name_form': 'Form Name', 
-            'name_protocol': 'Protocol Name', 
-            'text_question': 'Question Text', 
-            'text': 'Response Text', 
-            'time_point': 'Time Point'
-        }, inplace=True)
+        # Export scope; rows are streamed from SQL in chunks into a temporary file, so cohort-wide exports
+        # never hold the whole result in memory
+        scope = st.radio("Export Scope", ["Selected Client", "All Clients", "Protocols", "Date Range"], horizontal=True,
+                         help="Choose which answers to export.")
+        filters = {}
+        ready = True
+        if scope == "Selected Client":
+            selected_client = st.selectbox("Select Client", clients['name'], help="Select a client to export their data.")
+            filters['client_ids'] = clients[clients['name'] == selected_client]['id'].tolist()
+            file_stem = f"{selected_client}_data"
+        elif scope == "Protocols":
+            export_protocols = st.multiselect("Select Protocols", protocols['name'], default=protocols['name'].tolist(),
+                                              key="export_protocols")
+            filters['protocol_ids'] = protocols[protocols['name'].isin(export_protocols)]['id'].tolist()
+            file_stem = "protocol_data"
+        elif scope == "Date Range":
+            today = datetime.date.today()
+            date_range = st.date_input("Answered Between", value=(today - datetime.timedelta(days=30), today))
+            # While only the first date is picked the range is a 1-tuple; exporting then would ignore the filter
+            ready = len(date_range) == 2
+            if ready:
+                filters['start'], filters['end'] = date_range
+            else:
+                st.caption("Pick the last date of the range to export.")
+            file_stem = "answers_by_date"
+        else:
+            file_stem = "all_clients_data"
 
         # Column selection for CSV export
-        available_columns = client_data.columns.tolist()
-        default_columns = ['Client Name', 'Email', 'Form Name', 'Protocol Name', 'Question Text', 'Response Text', 'Time Point']
-        default_columns = [col for col in default_columns if col in available_columns]
-
-        selected_columns = st.multiselect("Select Columns to Export", available_columns, default=default_columns)
-
-        # Filter selected columns
-        client_data_csv = client_data[selected_columns]
+        selected_columns = st.multiselect("Select Columns to Export", list(export.EXPORT_COLUMNS),
+                                          default=export.DEFAULT_EXPORT_COLUMNS)
+        compress = st.checkbox("Compress (gzip)", value=scope != "Selected Client",
+                               help="Recommended for exports covering many clients.")
+
+        if st.button("Prepare CSV Export", disabled=not (selected_columns and ready)):
+            previous = st.session_state.pop('csv_export', None)
+            if previous and os.path.exists(previous['path']):
+                os.remove(previous['path'])
+            suffix = ".csv.gz" if compress else ".csv"
+            path = new_export_path(suffix)
+            with st.spinner("Exporting..."):
+                num_rows = export.write_csv(get_db_engine(), export.export_query(selected_columns, **filters), path,
+                                            compress=compress)
+            st.session_state.csv_export = {'path': path, 'file_name': f"{file_stem}{suffix}", 'rows': num_rows,
+                                           'mime': "application/gzip" if compress else "text/csv"}
 
         # Export data as CSV
-        st.download_button(
-            label="Download Client Data as CSV",
-            data=client_data_csv.to_csv(index=False),
-            file_name=f"{selected_client}_data.csv",
-            mime="text/csv"
-        )
+        csv_export = st.session_state.get('csv_export')
+        if csv_export and os.path.exists(csv_export['path']):
+            st.write(f"{csv_export['rows']:,} rows exported.")
+            download_file("Download Data as CSV", csv_export['path'], csv_export['file_name'], csv_export['mime'])
 
     with tab2:
         st.subheader("Generate Report")
@@ -484,79 +797,104 @@ def data_export(clients, forms, questions, responses, client_form_responses, pro
         if report_type == "Protocol Efficacy":
             st.info("Generate a report showing the efficacy of selected protocols.")
             selected_protocols = st.multiselect("Select Protocols", protocols['name'], default=protocols['name'].tolist())
-            selected_protocol_ids = protocols[protocols['name'].isin(selected_protocols)]['id'].tolist()
-
-            # Filter data for selected protocols
-            protocol_data = client_form_responses[client_form_responses['protocol_id'].isin(selected_protocol_ids)]
-            protocol_data = protocol_data.merge(responses, left_on='response_id', right_on='id', suffixes=('', '_response'))
-            protocol_data = protocol_data.merge(questions, left_on='question_id', right_on='id', suffixes=('', '_question'))
-            protocol_data = protocol_data.merge(forms, left_on='form_id', right_on='id', suffixes=('', '_form'))
-            protocol_data = protocol_data.merge(protocols, left_on='protocol_id', right_on='id', suffixes=('', '_protocol'))
+            selected_protocol_ids = tuple(protocols[protocols['name'].isin(selected_protocols)]['id'].tolist())
 
             # Plotting protocol efficacy
-            avg_scores_protocols = protocol_data.groupby(['protocol_id', 'time_point']).apply(
-                lambda x: x['response_id'].map(responses.set_index('id')['text'].astype(int)).mean() * 100 / 4
-            ).reset_index(name='average_score')
-            avg_scores_protocols = avg_scores_protocols.merge(protocols, left_on='protocol_id', right_on='id')
+            protocol_stats = load_timepoint_stats('protocol_id', protocol_ids=selected_protocol_ids)
+            avg_scores_protocols = chart_frame(protocol_stats, 'protocol_id', protocols)
 
-            fig_protocols = px.line(avg_scores_protocols, x='time_point', y='average_score', color='name',
-                                    labels={'time_point': 'Time Point', 'average_score': 'Average Score (%)', 'name': 'Protocol'})
-            st.plotly_chart(fig_protocols)
+            fig_protocols = timepoint_line_chart(avg_scores_protocols, 'Protocol')
+            show_chart(fig_protocols)
 
-            if st.button("Generate PDF Report"):
-                st.write("Feature not implemented yet.")
+            # Per-client change from Baseline with the configured responder threshold, as in the PDF report
+            st.write("### Change From Baseline")
+            direction = "fell" if LOWER_SCORES_IMPROVE else "rose"
+            st.caption(f"Responders: clients whose score {direction} by more than {RESPONDER_THRESHOLD:g} points "
+                       "from Baseline.")
+            change_summary = load_change_summary('protocol_id', 'protocol')
+            show_change_table(change_summary[change_summary['protocol_id'].isin(selected_protocol_ids)], "Protocol")
+
+            if st.button("Generate PDF Report", disabled=not selected_protocol_ids):
+                submit_report('protocol_efficacy', selected_protocol_ids)
+            show_report_job('protocol_efficacy', selected_protocol_ids, "protocol_efficacy_report.pdf")
 
         elif report_type == "Client Report":
             st.info("Generate a detailed report for the selected client.")
+            report_client = st.selectbox("Select Client", clients['name'], key="report_client",
+                                         help="Select a client to generate their report.")
+            client_id = clients[clients['name'] == report_client]['id'].values[0]
             
-            # Filter client data
-            client_data = client_form_responses[client_form_responses['client_id'] == client_id]
-            client_data = client_data.merge(responses, left_on='response_id', right_on='id', suffixes=('', '_response'))
-            client_data = client_data.merge(questions, left_on='question_id', right_on='id', suffixes=('', '_question'))
-            client_data = client_data.merge(forms, left_on='form_id', right_on='id', suffixes=('', '_form'))
-            client_data = client_data.merge(protocols, left_on='protocol_id', right_on='id', suffixes=('', '_protocol'))
-
             # Plotting client data
-            avg_scores_forms = client_data.groupby(['form_id', 'time_point']).apply(
-                lambda x: x['response_id'].map(responses.set_index('id')['text'].astype(int)).mean() * 100 / 4
-            ).reset_index(name='average_score')
-            avg_scores_forms = avg_scores_forms.merge(forms, left_on='form_id', right_on='id')
+            client_ids = (int(client_id),)
+            avg_scores_forms = chart_frame(load_timepoint_stats('form_id', client_ids=client_ids), 'form_id', forms)
 
-            fig_forms = px.line(avg_scores_forms, x='time_point', y='average_score', color='name',
-                                labels={'time_point': 'Time Point', 'average_score': 'Average Score (%)', 'name': 'Form'})
-            st.plotly_chart(fig_forms)
+            fig_forms = timepoint_line_chart(avg_scores_forms, 'Form')
+            show_chart(fig_forms)
 
-            avg_scores_protocols = client_data.groupby(['protocol_id', 'time_point']).apply(
-                lambda x: x['response_id'].map(responses.set_index('id')['text'].astype(int)).mean() * 100 / 4
-            ).reset_index(name='average_score')
-            avg_scores_protocols = avg_scores_protocols.merge(protocols, left_on='protocol_id', right_on='id')
+            client_protocol_stats = load_timepoint_stats('protocol_id', client_ids=client_ids)
+            avg_scores_protocols = chart_frame(client_protocol_stats, 'protocol_id', protocols)
 
-            fig_protocols = px.line(avg_scores_protocols, x='time_point', y='average_score', color='name',
-                                    labels={'time_point': 'Time Point', 'average_score': 'Average Score (%)', 'name': 'Protocol'})
-            st.plotly_chart(fig_protocols)
+            fig_protocols = timepoint_line_chart(avg_scores_protocols, 'Protocol')
+            show_chart(fig_protocols)
 
             if st.button("Generate PDF Report"):
-                st.write("Feature not implemented yet.")
-
-# Sidebar for navigation
-st.sidebar.image("assets/naiture_ai_white.png", use_column_width=True)
-st.sidebar.title("Dashboard Demo")
-page = st.sidebar.radio("Go to", ["Overview", "Form Response Distribution", "Client Progress Over Time", "Data Export"])
-
-# Page Settings section
-st.sidebar.title("Page Settings")
-if st.sidebar.button("Toggle Wide Mode", help="Switch between wide and centered page layouts."):
-    toggle_wide_mode()
-
-# Load data
-clients, forms, questions, responses, client_form_responses, protocols = load_data()
-
-# Render selected page
-if page == "Overview":
-    overview_page(clients, forms, questions, responses, client_form_responses, protocols)
-elif page == "Form Response Distribution":
-    form_response_distribution(forms, client_form_responses, responses, questions)
-elif page == "Client Progress Over Time":
-    client_progress_over_time(clients, client_form_responses, responses, questions)
-elif page == "Data Export":
-    data_export(clients, forms, questions, responses, client_form_responses, protocols)
+                submit_report('client', [int(client_id)])
+            show_report_job('client', [int(client_id)], f"{report_client}_report.pdf")
+
+            # Batch mode: one report per client, rendered in parallel by the worker pool
+            st.write("---")
+            if st.button("Generate Reports for All Clients", disabled=not reports.PDF_AVAILABLE):
+                version = reports.data_version(get_db_engine())
+                st.session_state.batch_reports = get_report_queue().submit_clients(clients['id'], version)
+                previous = st.session_state.pop('batch_zip', None)
+                if previous and os.path.exists(previous):
+                    os.remove(previous)
+            show_batch_reports(clients)
+
+# Every page and the whole tables it is passed, in argument order. Narrower data is read through the cached
+# accessors above: the Overview uses the SQL aggregates, the distribution page one form's scores, the
+# progress page one client's answers (sliced from the client index once loaded), the question page the question summary table and the
+# cohort page the membership and client summary tables.
+PAGES = {
+    "Overview": (overview_page, ()),
+    "Form Response Distribution": (form_response_distribution, ('form',)),
+    "Client Progress Over Time": (client_progress_over_time, ('client', 'form', 'protocol')),
+    "Question Analytics": (question_analytics, ('form', 'form_question')),
+    "Cohort Comparison": (cohort_comparison, ('form', 'protocol')),
+    "Data Export": (data_export, ('client', 'form', 'protocol')),
+}
+
+# The dashboard itself. Spawned report and bootstrap workers re-import this script as __mp_main__; the guard
+# keeps them to its imports and definitions.
+if __name__ == "__main__":
+    # Initialize session state for wide mode
+    if "wide_mode" not in st.session_state:
+        st.session_state.wide_mode = False
+
+    # Set page configuration based on session state
+    layout = 'wide' if st.session_state.wide_mode else 'centered'
+    st.set_page_config(layout=layout)
+
+    # Sidebar for navigation
+    st.sidebar.image("assets/naiture_ai_white.png", use_column_width=True)
+    st.sidebar.title("Dashboard Demo")
+    page = st.sidebar.radio("Go to", list(PAGES))
+
+    # Page Settings section
+    st.sidebar.title("Page Settings")
+    if st.sidebar.button("Toggle Wide Mode", help="Switch between wide and centered page layouts."):
+        toggle_wide_mode()
+    show_performance = st.sidebar.checkbox("Show Performance Panel", value=False,
+                                           help="Show where the time goes: data loads, aggregations, figures and SQL.")
+    start_metrics_server()
+
+    # Render selected page with the tables it declares; anything narrower it loads itself
+    render_page, page_tables = PAGES[page]
+    with perf.timed(f"page:{page}"):
+        with st.spinner("Loading data..."):
+            tables = load_tables(page_tables)
+        render_page(*(tables[table_name] for table_name in page_tables))
+
+    # Drawn after the page so it includes this run's timings
+    if show_performance:
+        performance_panel()